@@ -1,27 +1,45 @@
 import logging
+from collections import defaultdict
 from datetime import timedelta
 
-from sqlalchemy import func
+from sqlalchemy import func, insert
+from sqlalchemy.orm import joinedload
 from werkzeug.exceptions import Forbidden, Unauthorized
 
 from jarr.bootstrap import session, conf
 from jarr.controllers import CategoryController, FeedController
 from jarr.lib.clustering_af.postgres_casting import to_vector
-from jarr.lib.utils import digest, utc_now
+from jarr.lib.utils import digest, title_hash, utc_now
 from jarr.models import Article, User
 
 from .abstract import AbstractController
 
 logger = logging.getLogger(__name__)
+ENRICH_PAGE_LENGTH = 100
 
 
 class ArticleController(AbstractController):
     _db_cls = Article
 
     def challenge(self, ids):
-        """Will return each id that wasn't found in the database."""
+        """Will return each id that wasn't found in the database.
+
+        Ids are dict of entry_id, feed_id and user_id; they are matched with
+        one query per feed against the ix_article_uid_fid_eid index.
+        """
+        ids = list(ids)
+        entry_ids = defaultdict(set)
+        for id_ in ids:
+            entry_ids[(id_['user_id'], id_['feed_id'])].add(id_['entry_id'])
+        known = set()
+        for (user_id, feed_id), feed_entry_ids in entry_ids.items():
+            query = (self.read(user_id=user_id, feed_id=feed_id,
+                               entry_id__in=feed_entry_ids)
+                     .with_entities(Article.user_id, Article.feed_id,
+                                    Article.entry_id))
+            known.update(tuple(row) for row in query)
         for id_ in ids:
-            if self.read(**id_).with_entities(self._db_cls.id).first():
+            if (id_['user_id'], id_['feed_id'], id_['entry_id']) in known:
                 continue
             yield id_
 
@@ -34,6 +52,14 @@ class ArticleController(AbstractController):
                                    User.is_active.__eq__(True),
                                    User.last_connection >= conn_max))
 
+    @staticmethod
+    def ready_for_clustering():
+        """Filters on articles which were enriched or have waited for it
+        long enough."""
+        timeout = timedelta(seconds=conf.clustering.enrichment_timeout)
+        return {'__or__': [{'enriched': True},
+                           {'retrieved_date__lt': utc_now() - timeout}]}
+
     @classmethod
     def count_unclustered(cls):
         return cls._filter_unclustered(func.count(Article.id)).all()[0][0]
@@ -41,12 +67,51 @@ class ArticleController(AbstractController):
     @classmethod
     def get_user_id_with_pending_articles(cls):
         for row in (cls._filter_unclustered(Article.user_id)
+                    .filter(*cls._to_filters(**cls.ready_for_clustering()))
+                    .group_by(Article.user_id)):
+            yield row[0]
+
+    @classmethod
+    def get_user_id_with_articles_to_enrich(cls):
+        for row in (cls._filter_unclustered(Article.user_id)
+                    .filter(Article.enriched.__eq__(False))
                     .group_by(Article.user_id)):
             yield row[0]
 
+    def enrich_pending_articles(self):
+        """Will enhance the articles waiting to be clustered which need it,
+        so that the clusterizer doesn't have to fetch their pages.
+
+        Articles are read by pages and each one is committed along with its
+        enhancement, an error on one of them won't stop the others."""
+        results, last_id = [], 0
+        query = (self.read(cluster_id=None, enriched=False)
+                 .options(joinedload(Article.feed)).order_by(Article.id))
+        while True:
+            page = query.filter(Article.id > last_id)\
+                .limit(ENRICH_PAGE_LENGTH).all()
+            for article in page:
+                last_id = article.id
+                try:
+                    self.enhance(article)
+                except Exception:
+                    logger.exception("%r: enrichment failed", article)
+                    session.rollback()
+                    continue
+                results.append(last_id)
+            if len(page) < ENRICH_PAGE_LENGTH:
+                break
+        logger.info("User(%s) got %d articles enriched",
+                    self.user_id, len(results))
+        return results
+
     @staticmethod
-    def enhance(article):
-        save = False
+    def enhance(article, commit=True):
+        """Fetch the page of an article of a truncated feed to complete it
+        and mark the article as enriched. If commit is false, changes are
+        only flushed."""
+        save = not article.enriched
+        article.enriched = True
         if article.feed.truncated_content:
             vector = article.content_generator.get_vector()
             if vector is not None:
@@ -57,9 +122,13 @@ class ArticleController(AbstractController):
                 if value and getattr(article, key) != value:
                     setattr(article, key, value)
                     save = True
+            article.title_hash = title_hash(article.title)
         if save:
             session.add(article)
-            session.commit()
+            if commit:
+                session.commit()
+            else:
+                session.flush()
 
     def create(self, **attrs):
         # handling special denorm for article rights
@@ -71,11 +140,62 @@ class ArticleController(AbstractController):
                 feed.user_id == attrs['user_id'] or self.user_id is None):
             raise Forbidden("no right on feed %r" % feed.id)
         attrs['user_id'], attrs['category_id'] = feed.user_id, feed.category_id
+        attrs.setdefault('enriched', not feed.truncated_content)
         attrs['vector'] = to_vector(attrs)
         if not attrs.get('link_hash') and attrs.get('link'):
             attrs['link_hash'] = digest(attrs['link'], alg='sha1', out='bytes')
+        attrs.setdefault('title_hash', title_hash(attrs.get('title')))
+        # committed along with the article
+        FeedController(feed.user_id).record_arrivals(
+            feed, [attrs.get('date', utc_now())], commit=False)
         return super().create(**attrs)
 
+    def create_many(self, feed_id, articles):
+        """Will create every given article of a feed at once.
+
+        Rights on the feed are checked once, vectors are computed within a
+        single multi-row INSERT and the session is committed once.
+        Return the ids of the created articles.
+        """
+        articles = list(articles)
+        if not articles:
+            return []
+        feed = FeedController(self.user_id).get(id=feed_id)
+        for attrs in articles:
+            if attrs.get('feed_id', feed_id) != feed_id:
+                raise Forbidden("can't create articles for several feeds")
+            if 'user_id' in attrs and not (
+                    feed.user_id == attrs['user_id'] or self.user_id is None):
+                raise Forbidden("no right on feed %r" % feed.id)
+            attrs['feed_id'] = feed.id
+            attrs['user_id'] = feed.user_id
+            attrs['category_id'] = feed.category_id
+            attrs.setdefault('enriched', not feed.truncated_content)
+            attrs['vector'] = to_vector(attrs)
+            if not attrs.get('link_hash') and attrs.get('link'):
+                attrs['link_hash'] = digest(attrs['link'], alg='sha1',
+                                            out='bytes')
+            attrs.setdefault('title_hash', title_hash(attrs.get('title')))
+        # every row of a multi-row INSERT has to provide the same columns
+        columns = {key for attrs in articles for key in attrs}
+        for key in columns:
+            default = Article.__table__.c[key].default
+            for attrs in articles:
+                if key in attrs:
+                    continue
+                if default is None:
+                    attrs[key] = None
+                elif default.is_callable:
+                    attrs[key] = default.arg(None)
+                else:
+                    attrs[key] = default.arg
+        stmt = insert(Article).values(articles).returning(Article.id)
+        ids = [row[0] for row in session.execute(stmt)]
+        FeedController(self.user_id).record_arrivals(
+            feed, [attrs.get('date') for attrs in articles], commit=False)
+        session.commit()
+        return ids
+
     def update(self, filters, attrs, return_objs=False, commit=True):
         user_id = attrs.get('user_id', self.user_id)
         if 'feed_id' in attrs:
@@ -87,6 +207,8 @@ class ArticleController(AbstractController):
             cat = CategoryController().get(id=attrs['category_id'])
             if not (self.user_id is None or cat.user_id == user_id):
                 raise Forbidden("no right on cat %r" % cat.id)
+        if 'title' in attrs:
+            attrs['title_hash'] = title_hash(attrs['title'])
         return super().update(filters, attrs, return_objs, commit)
 
     def remove_from_cluster(self, article):
@@ -95,7 +217,8 @@ class ArticleController(AbstractController):
         Return True if the article is deleted at the end or not
         """
         from jarr.controllers.cluster import ClusterController
-        from jarr.controllers.article_clusterizer import Clusterizer
+        from jarr.controllers.article_clusterizer import (
+            Clusterizer, forget_corpus_entries)
         if not article.cluster_id:
             return
         clu_ctrl = ClusterController(self.user_id)
@@ -115,6 +238,7 @@ class ArticleController(AbstractController):
                 Clusterizer(article.user_id).enrich_cluster(
                         cluster, new_art, cluster.read, cluster.liked,
                         force_article_as_main=True)
+        forget_corpus_entries(article.user_id, [article.id])
         self.update({'id': article.id},
                     {'cluster_id': None,
                      'cluster_reason': None,
@@ -1,16 +1,24 @@
 import logging
+import time
+from bisect import bisect_left, bisect_right
+from heapq import heapify, heappop, heappush
 from collections import defaultdict
 from datetime import timedelta
 from functools import partial
 
-from jarr.bootstrap import conf, session
+from jarr.bootstrap import REDIS_CONN, conf, session
 from jarr.controllers import ArticleController
+from jarr.lib.clustering_af.corpus import CorpusEntry
 from jarr.lib.clustering_af.grouper import get_best_match_and_score
+from jarr.lib.clustering_af.inverted_index import InvertedIndex
+from jarr.lib.clustering_af.minhash import MinHashLSH
+from jarr.lib.clustering_af.vector import TFIDFCorpus
 from jarr.lib.enums import ArticleType, ClusterReason, ReadReason
+from jarr.lib.utils import utc_now
 from jarr.metrics import ARTICLE_CREATION, TFIDF_SCORE, WORKER_BATCH
-from jarr.models import Article, Cluster, Feed
+from jarr.models import Article, Category, Cluster, Feed, User
 from jarr.signals import event
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, func, or_
 
 logger = logging.getLogger(__name__)
 NO_CLUSTER_TYPE = {ArticleType.image, ArticleType.video, ArticleType.embedded}
@@ -20,39 +28,126 @@ WAKABLE_REASONS = {
     ReadReason.filtered,
 }
 cluster_event = partial(event.send, module=__name__)
+CONFIG_ATTRS = (
+    "cluster_enabled",
+    "cluster_tfidf_enabled",
+    "cluster_same_category",
+    "cluster_same_feed",
+    "cluster_wake_up",
+)
+JARR_CORPUS_KEY = "jarr.corpus.%d"
+JARR_CORPUS_MAX_ID_KEY = "jarr.corpus.%d.max_id"
 
 
-def get_tfidf_pref(feed, pref_name):
+def get_cluster_pref(feed, pref_name, section="tfidf"):
     """Tool to figure out clustering setting for a feed.
 
     For a given feed and a given attribute name will return a boolean
     If this same attribute is set to false on feed's user false will be
     returned, if it's set to false on feed's category false will also be
     returned. If not the value be returned from feed configuration.
-    Defaults are set in configurations
+    Defaults are set in configurations, in the given section of
+    conf.clustering. Settings of other sections than tfidf are prefixed by
+    the section name in cluster_conf (ie: minhash_min_score).
     """
+    key = pref_name if section == "tfidf" else f"{section}_{pref_name}"
     objs = feed.user, feed.category, feed
     for obj in objs:
         if obj is None:
             continue
-        if not obj.cluster_conf or pref_name not in obj.cluster_conf:
+        if not obj.cluster_conf or key not in obj.cluster_conf:
             continue
-        if not obj.cluster_conf[pref_name] and obj is not feed:
+        if not obj.cluster_conf[key] and obj is not feed:
             continue
-        return obj.cluster_conf.get(pref_name)
-    return getattr(conf.clustering.tfidf, pref_name)
+        return obj.cluster_conf.get(key)
+    return getattr(getattr(conf.clustering, section), pref_name)
+
+
+get_tfidf_pref = partial(get_cluster_pref, section="tfidf")
+get_minhash_pref = partial(get_cluster_pref, section="minhash")
 
 
 def _true_or_unset(attr):
     return or_(attr.__eq__(True), attr.__eq__(None))
 
 
+def forget_corpus_entries(user_id, article_ids):
+    """Remove articles from the cached corpus of a user, for those not to be
+    compared with new articles until clustered again."""
+    if article_ids:
+        REDIS_CONN.hdel(JARR_CORPUS_KEY % user_id, *article_ids)
+
+
+def forget_corpus(user_id):
+    """Drop the cached corpus of a user, it'll be built again on next use."""
+    REDIS_CONN.delete(
+        JARR_CORPUS_KEY % user_id, JARR_CORPUS_MAX_ID_KEY % user_id
+    )
+
+
 class Clusterizer:
-    def __init__(self, user_id=None):
+    def __init__(self, user_id=None, batch=False):
+        """In batch mode, clustered articles are committed by batches (see
+        conf.clustering.commit_every and commit_delay), the caller has to
+        commit the last one."""
         self.user_id = user_id
-        self.corpus = []
+        self.batch = batch
+        self._uncommitted = 0
+        self._uncached = []
+        self._batch_start = time.monotonic()
+        self.corpus = []  # sorted by magnitude, see get_neighbors
+        self._corpus_magnitudes = []
+        self._corpus_by_id = {}
+        self._by_date = []  # heap of (date, id) of corpus entries
+        # heap of (retrieved date, id) of entries already too old by date
+        self._by_retrieved_date = []
+        self._aged_out_for = None
+        self.corpus_index = InvertedIndex()
+        self.corpus_tfidf = TFIDFCorpus()
+        self.corpus_lsh = MinHashLSH(
+            conf.clustering.minhash.permutations, conf.clustering.minhash.bands
+        )
         self.corpus_initialized = False
-        self._config_cache = defaultdict(lambda: defaultdict(dict))
+        self._feed_configs = {}
+        self._config_users = set()
+        self._cluster_feed_ids = {}
+
+    def _load_feed_configs(self, user_id, feed_id=None):
+        """Resolve in a single query the configuration of every feed of a
+        user, or of one of its feeds: feed settings override category
+        settings which override user settings."""
+        columns = [
+            func.coalesce(
+                getattr(Feed, attr), getattr(Category, attr),
+                getattr(User, attr)
+            )
+            for attr in CONFIG_ATTRS
+        ]
+        query = (
+            session.query(Feed.id, *columns)
+            .join(User, User.id == Feed.user_id)
+            .outerjoin(Category, Category.id == Feed.category_id)
+            .filter(Feed.user_id == user_id)
+        )
+        if feed_id is not None:
+            query = query.filter(Feed.id == feed_id)
+        for loaded_id, *values in query:
+            self._feed_configs[loaded_id] = dict(zip(CONFIG_ATTRS, values))
+        if feed_id is None:
+            self._config_users.add(user_id)
+
+    def _get_feed_config(self, feed_id, user_id, attr):
+        if feed_id not in self._feed_configs:
+            # user not loaded yet or feed created since
+            self._load_feed_configs(
+                user_id, feed_id if user_id in self._config_users else None
+            )
+        if feed_id not in self._feed_configs:  # feed deleted since
+            user = session.get(User, user_id)
+            self._feed_configs[feed_id] = {
+                name: getattr(user, name) for name in CONFIG_ATTRS
+            }
+        return self._feed_configs[feed_id][attr]
 
     def get_config(self, obj, attr):
         """For an object among Category, Feed, Cluster and Article a given
@@ -60,58 +155,289 @@ class Clusterizer:
         The attribute will be tested on the given object, and if not either
         True or False, the function will browse parent object to determine
         config value.
-        In any case, computed value is cached in Clusterizer instance.
+        Configurations of every feed of a user are resolved at once and
+        cached in Clusterizer instance, so are the feeds of a cluster.
         """
-
-        def cache(val):
-            self._config_cache[obj.__class__.__name__][attr][obj.id] = val
-            return val
-
-        if obj.id in self._config_cache[obj.__class__.__name__]:
-            return self._config_cache[obj.__class__.__name__][obj.id]
-        if obj.__class__.__name__ == "Article":
-            return cache(self.get_config(obj.feed, attr))
-        if obj.__class__.__name__ == "Cluster":
-            return cache(
-                all(self.get_config(article, attr) for article in obj.articles)
+        cls_name = obj.__class__.__name__
+        if cls_name == "Article":
+            return self._get_feed_config(obj.feed_id, obj.user_id, attr)
+        if cls_name == "Feed":
+            return self._get_feed_config(obj.id, obj.user_id, attr)
+        if cls_name == "Cluster":
+            if obj.id not in self._cluster_feed_ids:
+                self._cluster_feed_ids[obj.id] = {
+                    feed_id for feed_id, in ArticleController(obj.user_id)
+                    .read(cluster_id=obj.id)
+                    .with_entities(Article.feed_id)
+                    .distinct()
+                }
+            return all(
+                self._get_feed_config(feed_id, obj.user_id, attr)
+                for feed_id in self._cluster_feed_ids[obj.id]
             )
         val = getattr(obj, attr)
         if val is not None:
-            logger.debug("%r.%s is %r", obj, attr, val)
-            return cache(val)
-        if obj.__class__.__name__ == "Feed" and obj.category_id:
-            return cache(self.get_config(obj.category, attr))
-        return cache(self.get_config(obj.user, attr))
+            return val
+        return getattr(obj.user, attr)
 
     def add_to_corpus(self, article):
-        "Add a given article to the Clusterizer.corpus if article is eligible."
+        """Add a given article to the Clusterizer.corpus and, once committed,
+        to the cached corpus of its user if article is eligible."""
+        if article.article_type in NO_CLUSTER_TYPE or not article.vector_terms:
+            return
+        entry = CorpusEntry.from_article(article)
+        if self.corpus_initialized:
+            self._index(entry)
+        self._uncached.append((article.user_id, entry))
+
+    def commit(self):
+        """Commit clustered articles and add them to the cached corpus."""
+        session.commit()
+        if conf.clustering.corpus_cache_ttl and self._uncached:
+            entries = defaultdict(dict)
+            for user_id, entry in self._uncached:
+                self._sign(entry)
+                entries[user_id][entry.id] = entry.dumps()
+            pipe = REDIS_CONN.pipeline(transaction=False)
+            for user_id in entries:
+                pipe.ttl(JARR_CORPUS_MAX_ID_KEY % user_id)
+            ttls = pipe.execute()
+            for (user_id, mapping), ttl in zip(entries.items(), ttls):
+                if ttl <= 0:  # no cache, it'll be built from the database
+                    continue
+                key = JARR_CORPUS_KEY % user_id
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, ttl)  # keeping the rebuild deadline
+            pipe.execute()
+        self._uncommitted = 0
+        self._uncached.clear()
+        self._batch_start = time.monotonic()
+
+    def _commit_batch(self):
+        """Commit if not in batch mode or if the batch is full or old."""
+        self._uncommitted += 1
+        if self.batch and (
+            self._uncommitted < conf.clustering.commit_every
+            and time.monotonic() - self._batch_start
+            < conf.clustering.commit_delay
+        ):
+            return
+        self.commit()
+
+    def _sign(self, entry):
+        """Compute the MinHash signature of an entry lacking a valid one,
+        return True if it had to be computed."""
+        if (
+            entry.signature is not None
+            and len(entry.signature) == self.corpus_lsh.permutations
+        ):
+            return False
+        entry.signature = self.corpus_lsh.signature(entry.simple_vector)
+        return True
+
+    def _index(self, entry):
+        if entry.id in self._corpus_by_id:
+            return
+        position = bisect_right(
+            self._corpus_magnitudes, entry.simple_vector_magnitude
+        )
+        self._corpus_magnitudes.insert(
+            position, entry.simple_vector_magnitude
+        )
+        self.corpus.insert(position, entry)
+        self._corpus_by_id[entry.id] = entry
+        heappush(self._by_date, (entry.date, entry.id))
+        self.corpus_index.add(entry.id, entry.simple_vector)
+        self.corpus_tfidf.add(
+            entry.id, entry.simple_vector, entry.simple_vector_magnitude
+        )
+        self._sign(entry)
+        self.corpus_lsh.add(entry.id, entry.simple_vector, entry.signature)
+
+    def _index_all(self, entries):
+        """Index many entries at once, sorting the corpus a single time."""
+        for entry in entries:
+            self._corpus_by_id[entry.id] = entry
+            self._by_date.append((entry.date, entry.id))
+            self.corpus_index.add(entry.id, entry.simple_vector)
+            self.corpus_tfidf.add(
+                entry.id, entry.simple_vector, entry.simple_vector_magnitude
+            )
+            self._sign(entry)
+            self.corpus_lsh.add(
+                entry.id, entry.simple_vector, entry.signature
+            )
+            self.corpus.append(entry)
+        heapify(self._by_date)
+        self.corpus.sort(key=lambda entry: entry.simple_vector_magnitude)
+        self._corpus_magnitudes = [
+            entry.simple_vector_magnitude for entry in self.corpus
+        ]
+
+    def _age_out_corpus(self, article):
+        """Remove from the corpus the articles which are now too old to be
+        compared with the given one. Articles being clusterized in date
+        order, those won't be needed again by this Clusterizer.
+
+        Entries are popped by date then by retrieved date from two heaps,
+        an entry being too old when both are, so only those aging out are
+        looked at, once per article."""
+        if self._aged_out_for == article.id:
+            return
+        self._aged_out_for = article.id
+        time_delta = timedelta(days=conf.clustering.time_delta)
+        min_date = article.date - time_delta
+        min_retrieved_date = article.retrieved_date - time_delta
+        while self._by_date and self._by_date[0][0] <= min_date:
+            _, entry_id = heappop(self._by_date)
+            entry = self._corpus_by_id.get(entry_id)
+            if entry is None:
+                continue
+            if entry.retrieved_date <= min_retrieved_date:
+                self._remove(entry)
+            else:
+                heappush(self._by_retrieved_date,
+                         (entry.retrieved_date, entry_id))
+        while (
+            self._by_retrieved_date
+            and self._by_retrieved_date[0][0] <= min_retrieved_date
+        ):
+            _, entry_id = heappop(self._by_retrieved_date)
+            entry = self._corpus_by_id.get(entry_id)
+            if entry is None:
+                continue
+            if entry.date <= min_date:
+                self._remove(entry)
+            else:
+                heappush(self._by_date, (entry.date, entry_id))
+
+    def _remove(self, entry):
+        self.corpus_index.remove(entry.id, entry.simple_vector)
+        self.corpus_tfidf.remove(entry.id)
+        self.corpus_lsh.remove(entry.id)
+        del self._corpus_by_id[entry.id]
+        position = bisect_left(
+            self._corpus_magnitudes, entry.simple_vector_magnitude
+        )
+        while self.corpus[position] is not entry:
+            position += 1
+        del self.corpus[position]
+        del self._corpus_magnitudes[position]
+
+    @staticmethod
+    def _read_corpus(user_id, **filters):
+        time_delta = timedelta(days=conf.clustering.time_delta)
+        query = ArticleController(user_id).read(
+            cluster_id__ne=None,
+            vector_terms__ne=None,
+            article_type=None,
+            __or__=[
+                {"date__gt": utc_now() - time_delta},
+                {"retrieved_date__gt": utc_now() - time_delta},
+            ],
+            **filters,
+        )
+        for row in query.with_entities(
+            Article.id,
+            Article.cluster_id,
+            Article.feed_id,
+            Article.category_id,
+            Article.date,
+            Article.retrieved_date,
+            Article.vector_terms,
+            Article.vector_counts,
+        ):
+            yield CorpusEntry(*row[:-2], dict(zip(row[-2], row[-1])))
+
+    def _load_corpus(self, article):
+        """Pull the corpus if it isn't initialized yet, else remove from it
+        the articles too old for the given one.
+
+        The corpus is read from the user's cache in redis, completed with
+        the articles clustered since the cache was built and stripped of
+        the ones now out of the clustering time window. If there is no
+        cache, the whole corpus is read from the database and cached until
+        conf.clustering.corpus_cache_ttl seconds from now, when it'll be
+        built again."""
+        if self.corpus_initialized:
+            self._age_out_corpus(article)
+            return
         self.corpus_initialized = True
-        if article.article_type not in NO_CLUSTER_TYPE:
-            self.corpus.append(article)
+        ttl = conf.clustering.corpus_cache_ttl
+        if not ttl:
+            self._index_all(self._read_corpus(article.user_id))
+            return
+        key = JARR_CORPUS_KEY % article.user_id
+        max_id_key = JARR_CORPUS_MAX_ID_KEY % article.user_id
+        pipe = REDIS_CONN.pipeline(transaction=False)
+        pipe.get(max_id_key)
+        pipe.ttl(max_id_key)
+        max_id, remaining = pipe.execute()
+        filters, cached, delta, outdated = {}, {}, {}, []
+        if max_id is not None and remaining > 0:
+            max_id, ttl = int(max_id), remaining
+            filters = {"id__gt": max_id}
+            min_date = utc_now() - timedelta(days=conf.clustering.time_delta)
+            for entry_id, raw in REDIS_CONN.hgetall(key).items():
+                entry = CorpusEntry.loads(raw)
+                if entry.date > min_date or entry.retrieved_date > min_date:
+                    cached[entry.id] = entry
+                    if self._sign(entry):  # cached without a valid one
+                        delta[entry.id] = entry
+                else:
+                    outdated.append(entry_id)
+        else:
+            max_id = None
+        read = {
+            entry.id: entry
+            for entry in self._read_corpus(article.user_id, **filters)
+        }
+        for entry in read.values():
+            self._sign(entry)
+        delta.update(read)
+        if max_id is None:
+            pipe.delete(key)
+        if outdated:
+            pipe.hdel(key, *outdated)
+        if delta:
+            pipe.hset(
+                key,
+                mapping={entry.id: entry.dumps() for entry in delta.values()},
+            )
+            max_id = max(max_id or 0, *delta)
+        pipe.expire(key, ttl)
+        pipe.set(max_id_key, max_id or 0, ex=ttl)
+        pipe.execute()
+        cached.update(delta)
+        self._index_all(cached.values())
+
+    def _in_corpus(self, feed_id, user_id):
+        """Whether articles of a feed are to be compared with new articles
+        according to the configuration of the feed, its category and user."""
+        if user_id not in self._config_users:
+            self._load_feed_configs(user_id)
+        config = self._feed_configs.get(feed_id)  # None for deleted feeds
+        return bool(
+            config
+            and config["cluster_enabled"]
+            and config["cluster_tfidf_enabled"]
+        )
 
     def get_neighbors(self, article):
         """Yield every eligible article eligibe for clustering with a given
         article from the Clusterizer.corpus. If the corpus isn't initialized
         yet, it'll be pulled out of the database.
         """
-
-        if not self.corpus_initialized:
-            filters = {
-                "__and__": [{"vector__ne": None}, {"vector__ne": ""}],
-                "article_type": None,
-            }
-            self.corpus_initialized = True
-            self.corpus = list(
-                self._get_query_for_clustering(
-                    article, filters=filters, filter_tfidf=True
-                )
-            )
+        self._load_corpus(article)
         tfidf_conf = conf.clustering.tfidf
         low_bound = article.simple_vector_magnitude / tfidf_conf.size_factor
         high_bound = article.simple_vector_magnitude * tfidf_conf.size_factor
         low_bound = max(tfidf_conf.min_vector_size, low_bound)
-        for candidate in self.corpus:
-            if low_bound <= candidate.simple_vector_magnitude <= high_bound:
+        # the corpus being sorted by magnitude, the ones within bounds follow
+        start = bisect_left(self._corpus_magnitudes, low_bound)
+        end = bisect_right(self._corpus_magnitudes, high_bound)
+        for candidate in self.corpus[start:end]:
+            if self._is_clusterable_with(article, candidate):
                 yield candidate
 
     def _get_cluster_by_link(self, article):
@@ -122,6 +448,70 @@ class Clusterizer:
             cluster_event(context="link", result="match", level=logging.INFO)
             return candidate.cluster
 
+    def _get_cluster_by_title(self, article):
+        if not article.title_hash:
+            return None
+        for candidate in self._get_query_for_clustering(
+            article, {"title_hash": article.title_hash}
+        ):
+            article.cluster_reason = ClusterReason.title
+            cluster_event(context="title", result="match", level=logging.INFO)
+            return candidate.cluster
+
+    def _is_clusterable_with(self, article, candidate):
+        "Whether a corpus entry may be clustered with a given article."
+        if candidate.id == article.id:
+            return False
+        time_delta = timedelta(days=conf.clustering.time_delta)
+        if not (
+            abs(candidate.date - article.date) < time_delta
+            or abs(candidate.retrieved_date - article.retrieved_date)
+            < time_delta
+        ):
+            return False
+        if not self._in_corpus(candidate.feed_id, article.user_id):
+            return False
+        if (
+            article.category_id
+            and candidate.category_id == article.category_id
+            and not self.get_config(article, "cluster_same_category")
+        ):
+            return False
+        return candidate.feed_id != article.feed_id or self.get_config(
+            article, "cluster_same_feed"
+        )
+
+    def _get_cluster_by_minhash(self, article):
+        if not get_minhash_pref(article.feed, "enabled"):
+            cluster_event(context="minhash", result="config forbid")
+            return None
+        min_vector_size = get_minhash_pref(article.feed, "min_vector_size")
+        if article.simple_vector_magnitude < min_vector_size:
+            cluster_event(context="minhash", result="vector too small")
+            return None
+        self._load_corpus(article)
+        matches = list(
+            self.corpus_lsh.query(
+                article.simple_vector,
+                get_minhash_pref(article.feed, "min_score"),
+            )
+        )
+        for doc_id, score in matches:
+            candidate = self._corpus_by_id[doc_id]
+            if not self._is_clusterable_with(article, candidate):
+                continue
+            cluster = session.get(Cluster, candidate.cluster_id)
+            if cluster is None:  # cache outdated by a cluster deletion
+                continue
+            article.cluster_reason = ClusterReason.minhash
+            article.cluster_score = int(score * 1000)
+            article.cluster_tfidf_with = candidate.id
+            cluster_event(
+                context="minhash", result="match", level=logging.INFO
+            )
+            return cluster
+        cluster_event(context="minhash", result="miss")
+
     def _get_cluster_by_similarity(self, article):
         neighbors = list(self.get_neighbors(article))
 
@@ -142,19 +532,30 @@ class Clusterizer:
         )
         WORKER_BATCH.labels(worker_type="tfidf_batch").observe(len(neighbors))
 
-        best_match, score = get_best_match_and_score(article, neighbors)
+        candidates = self.corpus_index.get_candidates(
+            article.simple_vector,
+            get_tfidf_pref(article.feed, "min_shared_terms"),
+            get_tfidf_pref(article.feed, "common_term_ratio"),
+        )
+        best_match, score = get_best_match_and_score(
+            article, neighbors, candidates, self.corpus_tfidf
+        )
         labeled = TFIDF_SCORE.labels(feed_type=article.feed.feed_type.value)
         labeled.observe(score)
+        cluster = None
         if score > get_tfidf_pref(article.feed, "min_score"):
+            # the cached corpus may be outdated by a cluster deletion
+            cluster = session.get(Cluster, best_match.cluster_id)
+        if cluster is not None:
             article.cluster_reason = ClusterReason.tf_idf
             article.cluster_score = int(score * 1000)
             article.cluster_tfidf_neighbor_size = len(neighbors)
             article.cluster_tfidf_with = best_match.id
             cluster_event(context="tfidf", result="match", level=logging.INFO)
-            return best_match.cluster
+            return cluster
         cluster_event(context="tfidf", result="miss")
 
-    def _get_query_for_clustering(self, article, filters, filter_tfidf=False):
+    def _get_query_for_clustering(self, article, filters):
         time_delta = timedelta(days=conf.clustering.time_delta)
         date_cond = {
             "date__lt": article.date + time_delta,
@@ -180,9 +581,6 @@ class Clusterizer:
             _true_or_unset(Feed.cluster_enabled),
         ]
 
-        if filter_tfidf:
-            feed_join.append(_true_or_unset(Feed.cluster_tfidf_enabled))
-
         query = (
             ArticleController(article.user_id)
             .read(**filters)
@@ -191,12 +589,8 @@ class Clusterizer:
 
         # operations involving categories are complicated, handling in software
         for candidate in query:
-            if not self.get_config(candidate, "cluster_enabled"):
-                continue
-            tfidf_enabled = self.get_config(candidate, "cluster_tfidf_enabled")
-            if filter_tfidf and not tfidf_enabled:
-                continue
-            yield candidate
+            if self.get_config(candidate, "cluster_enabled"):
+                yield candidate
 
     def _create_from_article(
         self, article, cluster_read=None, cluster_liked=False
@@ -221,6 +615,8 @@ class Clusterizer:
     ):
         "Will add given article to given cluster."
         article.cluster = cluster
+        if cluster.id in self._cluster_feed_ids:
+            self._cluster_feed_ids[cluster.id].add(article.feed_id)
         # handling read status
         if cluster.read is None:  # no read status, new cluster
             cluster.read = bool(cluster_read)
@@ -238,17 +634,7 @@ class Clusterizer:
             logger.debug("waking up %r", cluster)
         # once one article is liked the cluster is liked
         cluster.liked = cluster.liked or cluster_liked
-        if (
-            force_article_as_main
-            or cluster.main_date > article.date
-            or (
-                not article.feed.truncated_content
-                and all(
-                    cluster_article.feed.truncated_content
-                    for cluster_article in cluster.articles
-                )
-            )
-        ):
+        if force_article_as_main or cluster.main_date > article.date:
             cluster.main_title = article.title
             cluster.main_date = article.date
             cluster.main_link = article.link
@@ -257,10 +643,11 @@ class Clusterizer:
         cluster.content = article.content_generator.generate_and_merge(
             cluster.content
         )
-        self.add_to_corpus(article)
         session.add(cluster)
         session.add(article)
-        session.commit()
+        session.flush()
+        self.add_to_corpus(article)
+        self._commit_batch()
         read_reason = cluster.read_reason.value if cluster.read_reason else ""
         ARTICLE_CREATION.labels(
             read_reason=read_reason,
@@ -279,22 +666,32 @@ class Clusterizer:
         logger.info("%r - processed filter: %r", article, filter_result)
         cluster_config = self.get_config(article.feed, "cluster_enabled")
 
-        # fetching article so that vector comparison is made on full content
-        ArticleController(article.user_id).enhance(article)
+        if not article.enriched:
+            # enrichment timed out, fetching article so that vector
+            # comparison is made on full content
+            ArticleController(article.user_id).enhance(article, commit=False)
 
         if not allow_clustering:
             cluster_event(context="clustering", result="filter forbid")
         elif not cluster_config:
             cluster_event(context="clustering", result="config forbid")
         else:
-            cluster = self._get_cluster_by_link(article)
+            cluster = self._get_cluster_by_link(
+                article
+            ) or self._get_cluster_by_title(article)
             if not cluster:
-                if not self.get_config(article.feed, "cluster_tfidf_enabled"):
-                    cluster_event(context="tfidf", result="config forbid")
-                elif article.article_type in NO_CLUSTER_TYPE:
+                if article.article_type in NO_CLUSTER_TYPE:
                     cluster_event(context="tfidf", result="wrong article type")
                 else:
-                    cluster = self._get_cluster_by_similarity(article)
+                    # near-duplicates follow their own minhash_* settings
+                    cluster = self._get_cluster_by_minhash(article)
+                    tfidf = self.get_config(
+                        article.feed, "cluster_tfidf_enabled"
+                    )
+                    if not cluster and not tfidf:
+                        cluster_event(context="tfidf", result="config forbid")
+                    elif not cluster:
+                        cluster = self._get_cluster_by_similarity(article)
             if cluster:
                 return self.enrich_cluster(
                     cluster, article, filter_read, filter_liked
@@ -1,14 +1,17 @@
 import logging
 from collections import defaultdict
 
-from sqlalchemy import Integer, and_, func
+from sqlalchemy import Integer, and_, func, tuple_
 from sqlalchemy.dialects.postgresql import ARRAY
-from sqlalchemy.orm import aliased
+from sqlalchemy.orm import aliased, joinedload
 from sqlalchemy.sql import exists, select
 
 from jarr.bootstrap import session
 from jarr.controllers.article import ArticleController, FeedController
-from jarr.controllers.article_clusterizer import Clusterizer
+from jarr.controllers.article_clusterizer import (
+    Clusterizer,
+    forget_corpus_entries,
+)
 from jarr.lib.filter import process_filters
 from jarr.metrics import WORKER_BATCH
 from jarr.models import Article, Cluster, Feed
@@ -30,23 +33,45 @@ __returned_keys = (
 JR_FIELDS = {key: getattr(Cluster, key) for key in __returned_keys}
 JR_SQLA_FIELDS = [getattr(Cluster, key) for key in __returned_keys]
 JR_PAGE_LENGTH = 30
+PENDING_PAGE_LENGTH = 100
 
 
 class ClusterController(AbstractController):
     _db_cls = Cluster
 
     # Clusterizer EP
+    @staticmethod
+    def _iter_pending_articles(actrl):
+        """Yield articles ready to be clustered in date order, read by pages
+        with their feed, its category and user."""
+        query = (
+            actrl.read(cluster_id=None, **actrl.ready_for_clustering())
+            .options(
+                joinedload(Article.feed).joinedload(Feed.user),
+                joinedload(Article.feed).joinedload(Feed.category),
+            )
+            .order_by(Article.date, Article.id)
+        )
+        last = None
+        while True:
+            page_query = query
+            if last is not None:
+                page_query = query.filter(tuple_(Article.date, Article.id)
+                                          > last)
+            page = page_query.limit(PENDING_PAGE_LENGTH).all()
+            if not page:
+                return
+            last = page[-1].date, page[-1].id
+            yield from page
+            if len(page) < PENDING_PAGE_LENGTH:
+                return
+
     def clusterize_pending_articles(self):
         results = []
         actrl = ArticleController(self.user_id)
-        art_count = actrl.read(cluster_id=None).count()
-        logger.info(
-            "User(%s) got %d articles to clusterize", self.user_id, art_count
-        )
-        WORKER_BATCH.labels(worker_type="clusterizer").observe(art_count)
-        clusterizer = Clusterizer(self.user_id)
-        feed_ids, fctrl = set(), FeedController(self.user_id)
-        for article in actrl.read(cluster_id=None):
+        clusterizer = Clusterizer(self.user_id, batch=True)
+        feed_ids = set()
+        for article in self._iter_pending_articles(actrl):
             filter_result = process_filters(
                 article.feed.filters,
                 {
@@ -58,8 +83,12 @@ class ClusterController(AbstractController):
             result = clusterizer.main(article, filter_result).id
             results.append(result)
             feed_ids.add(article.feed_id)
-        for feed_id in feed_ids:
-            fctrl.update_unread_count(feed_id)
+        clusterizer.commit()
+        logger.info(
+            "User(%s) got %d articles clusterized", self.user_id, len(results)
+        )
+        WORKER_BATCH.labels(worker_type="clusterizer").observe(len(results))
+        FeedController(self.user_id).update_unread_counts(feed_ids)
         return results
 
     def update(self, filters, attrs, return_objs=False, commit=True):
@@ -204,6 +233,13 @@ class ClusterController(AbstractController):
 
         self.update({"id": obj_id}, {"main_article_id": None}, commit=False)
         actrl = ArticleController(self.user_id)
+        art_ids_by_user = defaultdict(list)
+        for user_id, art_id in actrl.read(cluster_id=obj_id).with_entities(
+            Article.user_id, Article.id
+        ):
+            art_ids_by_user[user_id].append(art_id)
+        for user_id, art_ids in art_ids_by_user.items():
+            forget_corpus_entries(user_id, art_ids)
         if delete_articles:
             for art in actrl.read(cluster_id=obj_id):
                 actrl.delete_only_article(art, commit=False)
@@ -4,12 +4,13 @@ from datetime import datetime, timedelta, timezone
 
 import dateutil.parser
 from sqlalchemy import and_, func
-from sqlalchemy.sql import delete, select
+from sqlalchemy.sql import delete, select, update
 from werkzeug.exceptions import Forbidden
 
 from jarr.bootstrap import conf, session
 from jarr.controllers.abstract import AbstractController
 from jarr.controllers.icon import IconController
+from jarr.lib.arrivals import predict_next_arrival, update_arrivals
 from jarr.lib.const import UNIX_START
 from jarr.lib.enums import FeedStatus
 from jarr.lib.utils import utc_now
@@ -17,7 +18,6 @@ from jarr.metrics import FEED_EXPIRES, FEED_LATENESS
 from jarr.models import Article, Category, Cluster, Feed, User
 
 logger = logging.getLogger(__name__)
-SPAN_FACTOR = 2
 LIST_W_CATEG_MAPPING = OrderedDict(
     (
         ("id", Feed.id),
@@ -137,7 +137,12 @@ class FeedController(AbstractController):
         yield from query
 
     def list_fetchable(self, limit=0):
-        now, feeds = utc_now(), list(self.list_late(limit))
+        return self.set_retrieving(list(self.list_late(limit)))
+
+    def set_retrieving(self, feeds):
+        """Mark feeds as retrieved now, for them not to be listed as late
+        again before conf.feed.min_expires seconds."""
+        now = utc_now()
         if feeds:
             for feed in feeds:
                 if feed.last_retrieved == UNIX_START:
@@ -181,7 +186,11 @@ class FeedController(AbstractController):
         return super().create(**attrs)
 
     def __denorm_cat_id_on_articles(self, feed, attrs):
+        from jarr.controllers.article_clusterizer import forget_corpus
+
         if "category_id" in attrs:
+            if attrs["category_id"] != feed.category_id:
+                forget_corpus(feed.user_id)
             self.__actrl.update(
                 {"feed_id": feed.id}, {"category_id": attrs["category_id"]}
             )
@@ -238,30 +247,52 @@ class FeedController(AbstractController):
             attrs["expires"] = max_expires
             method = "defaulted to max"
 
-        art_count = self.__actrl.read(
-            feed_id=feed.id, retrieved_date__gt=now - max_delta * SPAN_FACTOR
-        ).count()
-        if not art_count and method == "from header min limited":
+        predicted = predict_next_arrival(
+            feed.arrival_interval, feed.last_arrival, feed.arrival_profile,
+            now, max_delta)
+        if predicted is None and method == "from header min limited":
             attrs["expires"] = now + 2 * min_delta
             method = "no article, twice min time"
-        elif art_count:
-            proposed_expires = now + max_delta / art_count / SPAN_FACTOR
-            if min_expires < proposed_expires < attrs["expires"]:
-                attrs["expires"] = proposed_expires
+        elif predicted is not None:
+            if min_expires < predicted < attrs["expires"]:
+                attrs["expires"] = predicted
                 method = "computed"
-            if proposed_expires < min_expires:
+            if predicted < min_expires:
                 method = "many articles, set to min expire"
                 attrs["expires"] = min_expires
         exp_s = (attrs["expires"] - now).total_seconds()
         logger.info(
-            "%r : %d articles, expiring in %ds (%s)",
+            "%r : next article expected %s, expiring in %ds (%s)",
             feed,
-            art_count,
+            predicted,
             exp_s,
             method,
         )
         FEED_EXPIRES.labels(method=method, feed_type=feed_type).observe(exp_s)
 
+    def record_arrivals(self, feed, dates, commit=True):
+        """Fold the publication dates of a feed's new articles into the
+        model its expiration is computed from."""
+        now = utc_now()
+        dates = [min(date if date.tzinfo else
+                     date.replace(tzinfo=timezone.utc), now)
+                 for date in dates if isinstance(date, datetime)]
+        if not dates:
+            return
+        interval, last_arrival, profile = update_arrivals(
+            feed.arrival_interval, feed.last_arrival, feed.arrival_profile,
+            dates)
+        super().update(
+            {"id": feed.id},
+            {
+                "arrival_interval": None if interval is None
+                else round(interval),
+                "last_arrival": last_arrival,
+                "arrival_profile": profile,
+            },
+            commit=commit,
+        )
+
     def update(self, filters, attrs, return_objs=False, commit=True):
         self._ensure_icon(attrs)
         self.__clean_feed_fields(attrs)
@@ -278,6 +309,7 @@ class FeedController(AbstractController):
         return super().update(filters, attrs, return_objs, commit)
 
     def delete(self, obj_id, commit=True):
+        from jarr.controllers.article_clusterizer import forget_corpus
         from jarr.controllers.cluster import ClusterController
 
         feed = self.get(id=obj_id)
@@ -307,6 +339,7 @@ class FeedController(AbstractController):
             )
 
         logger.info("DELETE %r - removing articles", feed)
+        forget_corpus(feed.user_id)
         session.execute(
             delete(Article).where(
                 Article.feed_id == feed.id, Article.user_id == feed.user_id
@@ -365,3 +398,39 @@ class FeedController(AbstractController):
         self.update({"id": feed_id}, {"unread_count": unread})
         if return_count:
             return unread
+
+    def update_unread_counts(self, feed_ids):
+        """Recompute unread counts of the given feeds in a single UPDATE."""
+        if not feed_ids:
+            return
+        where = tuple()
+        if self.user_id:
+            where = (
+                Cluster.user_id == self.user_id,
+                Article.user_id == self.user_id,
+            )
+        unreads = (
+            select(Feed.id, func.count(Article.id).label("unread"))
+            .outerjoin(
+                Article.__table__.join(
+                    Cluster.__table__,
+                    and_(
+                        Article.cluster_id == Cluster.id,
+                        Cluster.user_id == Article.user_id,
+                        Cluster.read.__eq__(False),
+                        *where
+                    ),
+                ),
+                Article.feed_id == Feed.id,
+            )
+            .where(Feed.id.in_(feed_ids))
+            .group_by(Feed.id)
+            .subquery()
+        )
+        session.execute(
+            update(Feed)
+            .where(Feed.id == unreads.c.id)
+            .values(unread_count=unreads.c.unread)
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
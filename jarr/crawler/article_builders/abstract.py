@@ -1,4 +1,5 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from jarr.bootstrap import conf
@@ -6,6 +7,8 @@ from jarr.lib.content_generator import YOUTUBE_RE, is_embedded_link
 from jarr.lib.enums import ArticleType
 from jarr.lib.filter import FiltersAction, process_filters
 from jarr.lib.html_parsing import clean_article_content
+from jarr.lib.link_resolution import (get_resolution, make_resolution,
+                                      set_resolution)
 from jarr.lib.url_cleaners import clean_urls, remove_utm_tags
 from jarr.lib.utils import clean_lang, digest, utc_now
 from requests.exceptions import MissingSchema
@@ -20,6 +23,7 @@ class AbstractArticleBuilder:
         self.entry = entry
         self.article = {}
         self._top_level = top_level
+        self._resolution = None
         self.construct(self.entry)
 
     @property
@@ -140,6 +144,49 @@ class AbstractArticleBuilder:
     def _all_articles(self):
         yield self.article
 
+    def _request_resolution(self, link):
+        head = self._head(link)
+        if not head:
+            return {}
+        link_hash = None
+        if link != head.url:
+            # removing utm_tags from link_hash, to allow clustering despite em
+            clean_link = remove_utm_tags(head.url)
+            if clean_link != head.url:
+                clean_head = self._head(clean_link)
+                if clean_head:
+                    link_hash = self.to_hash(clean_head.url)
+        return make_resolution(head.url, head.headers.get("Content-Type"),
+                               head.headers.get("Content-Language"), link_hash)
+
+    def resolve_link(self):
+        """Return the resolution of the article link (see
+        jarr.lib.link_resolution), from the cache shared with the builders
+        of every user if possible. An empty dict if it couldn't be fetched.
+        """
+        if self._resolution is None:
+            link = self.article["link"]
+            self._resolution = get_resolution(link)
+            if self._resolution is None:
+                self._resolution = self._request_resolution(link)
+                set_resolution(link, self._resolution)
+        return self._resolution
+
+    @staticmethod
+    def resolve_links(builders):
+        """Resolve the links of several builders concurrently, so that
+        enhancing them doesn't wait for each round-trip in turn."""
+        builders = [builder for builder in builders
+                    if builder.article.get("link")
+                    and not is_embedded_link(builder.article["link"])]
+        if len(builders) < 2:
+            return
+        workers = min(len(builders), conf.crawler.concurrency)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(lambda builder: builder.resolve_link(),
+                                  builders):
+                pass
+
     def enhance(self):
         if is_embedded_link(self.article["link"]):
             self.article["article_type"] = ArticleType.embedded
@@ -150,25 +197,21 @@ class AbstractArticleBuilder:
                 pass
             yield from self._all_articles()
             return
-        head = self._head(self.article["link"])
-        if not head:
+        resolution = self.resolve_link()
+        if not resolution:
             yield from self._all_articles()
             return
 
-        if self.article["link"] != head.url:
-            self.article["link"] = head.url  # fix link in case of redirect
-            # removing utm_tags from link_hash, to allow clustering despite em
-            clean_link = remove_utm_tags(self.article["link"])
-            if clean_link != self.article["link"]:
-                clean_head = self._head(clean_link)
-                if clean_head:
-                    self.article["link_hash"] = self.to_hash(clean_head.url)
-        self._feed_content_type(head.headers.get("Content-Type"), self.article)
+        if self.article["link"] != resolution["url"]:
+            # fix link in case of redirect
+            self.article["link"] = resolution["url"]
+            if resolution["link_hash"]:
+                self.article["link_hash"] = bytes.fromhex(
+                    resolution["link_hash"])
+        self._feed_content_type(resolution["content_type"], self.article)
 
-        if not self.article.get("lang") and head.headers.get(
-            "Content-Language"
-        ):
+        if not self.article.get("lang") and resolution["content_language"]:
             # correcting lang from http headers
-            lang = head.headers["Content-Language"].split(",")[0]
+            lang = resolution["content_language"].split(",")[0]
             self.article["lang"] = lang
         yield from self._all_articles()
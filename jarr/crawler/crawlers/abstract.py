@@ -1,19 +1,27 @@
+import asyncio
+import json
 import logging
+from contextlib import AsyncExitStack
+from functools import partial
 from typing import Optional, Type
 
-from jarr.bootstrap import conf
+from jarr.bootstrap import REDIS_CONN, conf
 from jarr.controllers import ArticleController, FeedController
 from jarr.crawler.article_builders.classic import ClassicArticleBuilder
 from jarr.crawler.article_builders.abstract import AbstractArticleBuilder
-from jarr.crawler.lib.headers_handling import (extract_feed_info,
+from jarr.crawler.lib.headers_handling import (CONDITIONAL_HEADERS,
+                                               extract_feed_info,
                                                prepare_headers)
-from jarr.crawler.requests_utils import (response_calculated_etag_match,
+from jarr.crawler.requests_utils import (dump_response, load_response,
+                                         response_calculated_etag_match,
                                          response_etag_match)
 from jarr.lib.enums import FeedType
-from jarr.lib.utils import jarr_get, utc_now
+from jarr.lib.utils import digest, jarr_get, normalize_url, utc_now
 from jarr.metrics import FEED_FETCH
 
 logger = logging.getLogger(__name__)
+JARR_SHARED_FETCH_KEY = 'jarr.fetch.%s'
+JARR_FEED_ENTRIES_KEY = 'jarr.entries.%d'
 
 
 class AbstractCrawler:
@@ -79,17 +87,78 @@ class AbstractCrawler:
     def parse_feed_response(self, response):
         raise NotImplementedError()
 
+    def parse_feed_entries(self, response):
+        """Return the parsed feed and an iterable over its entries, which
+        may be parsed as they are reached. None if it couldn't be parsed."""
+        parsed = self.parse_feed_response(response)
+        if parsed is None:
+            return None
+        return parsed, parsed['entries']
+
+    def entry_digest(self, entry):
+        """Hash of a parsed entry and of what decides how it's processed,
+        an entry with a known digest has already been processed as is."""
+        return digest(json.dumps([self.feed.filters, entry],
+                                 sort_keys=True, default=str))
+
+    def get_known_entries(self):
+        """Digests of the entries the feed produced on its last crawl."""
+        if not conf.crawler.entries_cache_ttl:
+            return set()
+        return {entry_digest.decode('utf8') for entry_digest
+                in REDIS_CONN.smembers(JARR_FEED_ENTRIES_KEY % self.feed.id)}
+
+    def remember_entries(self, entry_digests, complete=True):
+        """Keep the digests of the entries of the feed. If not all the
+        entries have been reached, the ones of the last crawl are kept as
+        well until the set expires."""
+        if not conf.crawler.entries_cache_ttl:
+            return
+        key = JARR_FEED_ENTRIES_KEY % self.feed.id
+        if not complete:
+            if entry_digests:
+                REDIS_CONN.sadd(key, *entry_digests)
+            return
+        pipe = REDIS_CONN.pipeline()
+        pipe.delete(key)
+        if entry_digests:
+            pipe.sadd(key, *entry_digests)
+            pipe.expire(key, conf.crawler.entries_cache_ttl)
+        pipe.execute()
+
     def create_missing_article(self, response):
         logger.info('%r: cache validation failed, challenging entries',
                     self.feed)
-        parsed = self.parse_feed_response(response)
-        if parsed is None:
+        result = self.parse_feed_entries(response)
+        if result is None:
             return
+        parsed, parsed_entries = result
 
+        known_entries, entry_digests = self.get_known_entries(), set()
+        known_run, complete = 0, True
+        # stopping on known entries only if newer ones can't come after them
+        newest_first, last_date = bool(conf.crawler.known_entries_stop), None
         ids, entries, skipped_list = [], {}, []
-        for entry in parsed['entries']:
+        for entry in parsed_entries:
             if not entry:
                 continue
+            entry_digest = self.entry_digest(entry)
+            entry_digests.add(entry_digest)
+            if newest_first:
+                date = self.article_builder.extract_date(entry)
+                newest_first = date is not None \
+                    and (last_date is None or date <= last_date)
+                last_date = date
+            if entry_digest in known_entries:
+                known_run += 1
+                if newest_first \
+                        and known_run == conf.crawler.known_entries_stop:
+                    logger.debug('%r: %d known entries in a row, stopping',
+                                 self.feed, known_run)
+                    complete = False
+                    break
+                continue
+            known_run = 0
             builder = self.article_builder(self.feed, entry, parsed)
             if builder.do_skip_creation:
                 skipped_list.append(builder.entry_ids)
@@ -98,36 +167,73 @@ class AbstractCrawler:
             entry_ids = builder.entry_ids
             entries[tuple(sorted(entry_ids.items()))] = builder
             ids.append(entry_ids)
-        if not ids and skipped_list:
-            logger.debug('%r: nothing to add (skipped %r) %r',
-                         self.feed, skipped_list, parsed)
+        if not ids:
+            logger.debug('%r: nothing to add (%d unchanged, skipped %r)',
+                         self.feed, len(entry_digests), skipped_list)
+            self.remember_entries(entry_digests, complete)
             return
         logger.debug("%r: found %d entries %r", self.feed, len(ids), ids)
 
-        article_created = False
         actrl = ArticleController(self.feed.user_id)
         new_entries_ids = list(actrl.challenge(ids=ids))
         logger.debug("%r: %d entries wern't matched and will be created",
                      self.feed, len(new_entries_ids))
-        for id_to_create in new_entries_ids:
-            article_created = True
-            builder = entries[tuple(sorted(id_to_create.items()))]
-            for new_article in builder.enhance():
-                article = actrl.create(**new_article)
-            logger.info('%r: created %r', self.feed, article)
-
-        if not article_created:
+        builders = [entries[tuple(sorted(id_to_create.items()))]
+                    for id_to_create in new_entries_ids]
+        self.article_builder.resolve_links(builders)
+        new_articles = []
+        for builder in builders:
+            new_articles.extend(builder.enhance())
+
+        if new_articles:
+            article_ids = actrl.create_many(self.feed.id, new_articles)
+            logger.info('%r: created articles %r', self.feed, article_ids)
+        else:
             logger.info('%r: all article matched in db, adding nothing',
                         self.feed)
+        self.remember_entries(entry_digests, complete)
 
     def get_url(self):
         return self.feed.link
 
+    def get_request_kwargs(self):
+        return {'timeout': conf.crawler.timeout,
+                'user_agent': conf.crawler.user_agent,
+                'headers': prepare_headers(self.feed)}
+
     def request(self):
-        return jarr_get(self.get_url(),
-                        timeout=conf.crawler.timeout,
-                        user_agent=conf.crawler.user_agent,
-                        headers=prepare_headers(self.feed))
+        from jarr.crawler.utils import get_session  # prevent circular import
+        kwargs = self.get_request_kwargs()
+        session = get_session(self.get_url(), kwargs.get('ssrf_protect', True))
+        return jarr_get(self.get_url(), session=session, **kwargs)
+
+    def get_shared_fetch_key(self):
+        """Crawlers of feeds sharing that key fetch the same resource."""
+        return JARR_SHARED_FETCH_KEY % digest(
+            f"{self.feed_type.value}:{normalize_url(self.get_url())}")
+
+    def get_shared_response(self):
+        """Return the response recently fetched for another feed pointing to
+        the same resource, if any."""
+        if not conf.crawler.shared_fetch_ttl:
+            return None
+        raw = REDIS_CONN.get(self.get_shared_fetch_key())
+        if raw is None:
+            return None
+        try:
+            response = load_response(raw)
+        except ValueError:  # shared in a former format
+            return None
+        logger.debug('%r: reusing shared response', self.feed)
+        return response
+
+    def share_response(self, response):
+        """Keep a full response to be reused by the other feeds pointing to
+        the same resource, their cache headers are checked against it."""
+        if conf.crawler.shared_fetch_ttl and response.status_code == 200:
+            REDIS_CONN.set(self.get_shared_fetch_key(),
+                           dump_response(response),
+                           ex=conf.crawler.shared_fetch_ttl)
 
     def is_cache_hit(self, response):
         if response.status_code == 304:
@@ -145,13 +251,62 @@ class AbstractCrawler:
 
     def crawl(self):
         logger.debug('%r: crawling resources', self.feed)
-        try:
-            response = self.request()
-            response.raise_for_status()
-        except Exception as error:
-            self.set_feed_error(error=error)
-            return
+        response = self.get_shared_response()
+        if response is None:
+            try:
+                response = self.request()
+                response.raise_for_status()
+            except Exception as error:
+                self.set_feed_error(error=error)
+                return
+            self.share_response(response)
+        self.process_response(response)
+
+    async def crawl_async(self, semaphore, executor=None, followers=(),
+                          throttle=None):
+        """Same as crawl, but the network round-trip is awaited in executor.
+
+        Url and headers are computed in the calling thread, so the feed
+        object (and the database session behind it) is never accessed from
+        the executor threads.
+
+        followers are crawlers with the same shared fetch key, the response
+        is processed for each of them as well. If their cache headers
+        differ, the resource is requested unconditionally.
+        throttle is a jarr.crawler.utils.HostThrottle, if provided the
+        request will wait for a slot on the feed's host.
+        """
+        from jarr.crawler.utils import get_session  # prevent circular import
+        logger.debug('%r: crawling resources asynchronously', self.feed)
+        crawlers = (self, *followers)
+        response = self.get_shared_response()
+        if response is None:
+            kwargs = self.get_request_kwargs()
+            if any(follower.get_request_kwargs() != kwargs
+                   for follower in followers):
+                kwargs['headers'] = {
+                    key: value for key, value in kwargs['headers'].items()
+                    if key not in CONDITIONAL_HEADERS}
+            loop = asyncio.get_running_loop()
+            url = self.get_url()
+            session = get_session(url, kwargs.get('ssrf_protect', True))
+            request = partial(jarr_get, url, session=session, **kwargs)
+            async with AsyncExitStack() as stack:
+                if throttle is not None:
+                    await stack.enter_async_context(throttle.slot(url))
+                await stack.enter_async_context(semaphore)
+                try:
+                    response = await loop.run_in_executor(executor, request)
+                    response.raise_for_status()
+                except Exception as error:
+                    for crawler in crawlers:
+                        crawler.set_feed_error(error=error)
+                    return
+            self.share_response(response)
+        for crawler in crawlers:
+            crawler.process_response(response)
 
+    def process_response(self, response):
         if not self.is_cache_hit(response):
             try:
                 self.create_missing_article(response)
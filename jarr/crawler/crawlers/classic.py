@@ -5,17 +5,30 @@ import feedparser
 
 from jarr.controllers.feed_builder import FeedBuilderController
 from jarr.crawler.crawlers.abstract import AbstractCrawler
+from jarr.crawler.lib.feedparser_utils import stream_feed
 from jarr.lib.enums import FeedType
 
 logger = logging.getLogger(__name__)
 
 
+def parse_feed_content(content):
+    return feedparser.parse(content.strip())
+
+
 class ClassicCrawler(AbstractCrawler):
     feed_type: Optional[FeedType] = FeedType.classic
 
     def parse_feed_response(self, response):
-        parsed = feedparser.parse(response.content.strip())
+        parsed = parse_feed_content(response.content)
         if not FeedBuilderController(self.feed.link, parsed).is_parsed_feed():
             self.set_feed_error(parsed_feed=parsed)
             return
         return parsed
+
+    def parse_feed_entries(self, response):
+        parsed, entries = stream_feed(response.content.strip(),
+                                      parse_feed_content)
+        if not FeedBuilderController(self.feed.link, parsed).is_parsed_feed():
+            self.set_feed_error(parsed_feed=parsed)
+            return
+        return parsed, entries
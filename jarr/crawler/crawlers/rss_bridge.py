@@ -5,9 +5,7 @@ from jarr.bootstrap import conf
 from jarr.crawler.article_builders.rss_bridge import (
     RSSBridgeArticleBuilder, RSSBridgeTwitterArticleBuilder)
 from jarr.crawler.crawlers.classic import ClassicCrawler
-from jarr.crawler.lib.headers_handling import prepare_headers
 from jarr.lib.enums import FeedType
-from jarr.lib.utils import jarr_get
 
 
 class RssBridgeAbstractCrawler(ClassicCrawler):
@@ -16,14 +14,8 @@ class RssBridgeAbstractCrawler(ClassicCrawler):
     article_builder = RSSBridgeArticleBuilder
     feed_type: Optional[FeedType] = None  # forcing this crawler to be ignored
 
-    def request(self):
-        return jarr_get(
-            self.get_url(),
-            timeout=conf.crawler.timeout,
-            user_agent=conf.crawler.user_agent,
-            headers=prepare_headers(self.feed),
-            ssrf_protect=False,
-        )
+    def get_request_kwargs(self):
+        return {**super().get_request_kwargs(), "ssrf_protect": False}
 
     def get_url(self):
         split = (
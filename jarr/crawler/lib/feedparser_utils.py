@@ -1,4 +1,19 @@
-from typing import Generator, List, Optional
+import io
+import logging
+import xml.etree.ElementTree as ET
+from itertools import takewhile
+from typing import Callable, Generator, Iterator, List, Optional, Tuple
+
+import feedparser
+
+logger = logging.getLogger(__name__)
+ENTRY_TAGS = {
+    "item",  # RSS 0.9x and 2.0
+    "{http://purl.org/rss/1.0/}item",
+    "{http://my.netscape.com/rdf/simple/0.9/}item",
+    "{http://www.w3.org/2005/Atom}entry",
+    "{http://purl.org/atom/ns#}entry",  # Atom 0.3
+}
 
 
 def reach_in(
@@ -28,3 +43,68 @@ def browse_keys(
         for value in reach_in(entry, key, sub_key):
             return value
     return None
+
+
+def _wrap(ancestors, children) -> bytes:
+    """Serialize children within empty copies of their ancestors, of
+    which there must be at least one."""
+    root, *descendants = (ET.Element(ancestor.tag, ancestor.attrib)
+                          for ancestor in ancestors)
+    parent = root
+    for node in descendants:
+        parent.append(node)
+        parent = node
+    parent.extend(children)
+    return ET.tostring(root)
+
+
+def _iter_feed(content: bytes) -> Generator:
+    ancestors: list = []
+    header = None
+    for event, elem in ET.iterparse(io.BytesIO(content),
+                                    events=("start", "end")):
+        if event == "start":
+            if header is None and ancestors and elem.tag in ENTRY_TAGS:
+                # what precedes the first entry describes the feed itself
+                preceding = takewhile(lambda child: child is not elem,
+                                      ancestors[-1])
+                header = feedparser.parse(_wrap(ancestors, preceding))
+                yield header
+            ancestors.append(elem)
+            continue
+        ancestors.pop()
+        if ancestors and elem.tag in ENTRY_TAGS:
+            yield from feedparser.parse(_wrap(ancestors, [elem]))["entries"]
+            ancestors[-1].remove(elem)
+        elif not ancestors and header is None:  # feed without entry
+            yield feedparser.parse(ET.tostring(elem))
+
+
+def stream_feed(
+    content: bytes, parse: Callable = feedparser.parse
+) -> Tuple[feedparser.FeedParserDict, Iterator]:
+    """Return a feed parsed without its entries and an iterator over those
+    entries, each of them parsed alone as it is reached.
+
+    Entries are the ones feedparser would have returned, but memory stays
+    bounded by the size of an entry and iterating may be stopped anytime.
+    If content isn't well formed XML, it is handed to parse whole instead.
+    """
+    stream = _iter_feed(content)
+    try:
+        return next(stream), _fallback_on_error(stream, content, parse)
+    except ET.ParseError as error:
+        logger.debug("couldn't stream feed (%r), parsing it whole", error)
+        parsed = parse(content)
+        return parsed, iter(parsed["entries"])
+
+
+def _fallback_on_error(stream: Iterator, content: bytes, parse: Callable):
+    done = 0
+    try:
+        for entry in stream:
+            yield entry
+            done += 1
+    except ET.ParseError as error:
+        logger.debug("couldn't stream feed (%r), parsing it whole", error)
+        yield from parse(content)["entries"][done:]
@@ -10,6 +10,7 @@ from jarr.lib.utils import digest, rfc_1123_utc, utc_now
 
 logger = logging.getLogger(__name__)
 MAX_AGE_RE = re.compile('max-age=([0-9]+)')
+CONDITIONAL_HEADERS = {'If-Modified-Since', 'If-None-Match', 'A-IM'}
 
 
 def _extract_max_age(headers, feed_info):
@@ -6,9 +6,11 @@ from ep_celery import celery_app
 from jarr.bootstrap import REDIS_CONN, conf
 from jarr.controllers import (ArticleController, ClusterController,
                               FeedController, UserController)
-from jarr.crawler.utils import Queues, lock, observe_worker_result_since
+from jarr.crawler.utils import (Queues, acquire_locks, crawl_concurrently,
+                                get_dispatch_countdowns, lock,
+                                observe_worker_result_since, release_locks)
 from jarr.lib.enums import FeedStatus
-from jarr.lib.utils import utc_now
+from jarr.lib.utils import normalize_url, utc_now
 from jarr.metrics import ARTICLES, USER, WORKER_BATCH
 
 urllib3.disable_warnings()
@@ -16,6 +18,7 @@ logger = logging.getLogger(__name__)
 LOCK_EXPIRE = 60 * 60
 JARR_FEED_DEL_KEY = 'jarr.feed-deleting'
 JARR_CLUSTERIZER_KEY = 'jarr.clusterizer.%d'
+JARR_ENRICHER_KEY = 'jarr.enricher.%d'
 
 
 @celery_app.task(name='crawler')
@@ -27,6 +30,31 @@ def process_feed(feed_id):
     FeedController(feed.user_id).update_unread_count(feed.id)
 
 
+@celery_app.task(name='crawler.batch')
+def process_feeds(feed_ids):
+    start = datetime.now()
+    locked_ids = acquire_locks('process-feed', feed_ids)
+    if len(locked_ids) != len(feed_ids):
+        logger.info('%d feeds already being crawled, skipping them',
+                    len(feed_ids) - len(locked_ids))
+    if not locked_ids:
+        observe_worker_result_since(start, 'process-feeds', 'skipped')
+        return
+    try:
+        feeds = list(FeedController().read(id__in=locked_ids))
+        logger.info("gonna crawl %d feeds", len(feeds))
+        crawl_concurrently([feed.crawler for feed in feeds])
+        FeedController().update_unread_counts([feed.id for feed in feeds])
+    except Exception as error:
+        observe_worker_result_since(start, 'process-feeds',
+                                    error.__class__.__name__)
+        raise
+    else:
+        observe_worker_result_since(start, 'process-feeds', 'ok')
+    finally:
+        release_locks('process-feed', locked_ids)
+
+
 @celery_app.task(name='clusterizer')
 @lock('clusterizer')
 def clusterizer(user_id):
@@ -35,6 +63,14 @@ def clusterizer(user_id):
     REDIS_CONN.delete(JARR_CLUSTERIZER_KEY % user_id)
 
 
+@celery_app.task(name='enricher')
+@lock('enricher')
+def enricher(user_id):
+    logger.warning("Gonna enrich pending articles")
+    ArticleController(user_id).enrich_pending_articles()
+    REDIS_CONN.delete(JARR_ENRICHER_KEY % user_id)
+
+
 @celery_app.task(name='feed_cleaner')
 @lock('feed-cleaner')
 def feed_cleaner(feed_id):
@@ -99,13 +135,37 @@ def scheduler():
     fctrl = FeedController()
     # browsing feeds to fetch
     queue = Queues.CRAWLING if conf.crawler.use_queues else Queues.DEFAULT
-    feeds = list(fctrl.list_fetchable(conf.crawler.batch_size))
+    chunk_size = conf.crawler.chunk_size
+    if chunk_size > 1:
+        feeds = list(fctrl.list_fetchable(conf.crawler.batch_size))
+    else:
+        feeds = list(fctrl.list_late(conf.crawler.batch_size))
+        # a feed dispatched after min_expires would be listed again while
+        # waiting, those are left late for the next runs
+        countdowns = get_dispatch_countdowns(
+            (feed.link for feed in feeds),
+            max_countdown=conf.feed.min_expires // 2)
+        feeds = fctrl.set_retrieving(
+            [feed for feed, countdown in zip(feeds, countdowns)
+             if countdown is not None])
+        countdowns = [countdown for countdown in countdowns
+                      if countdown is not None]
     WORKER_BATCH.labels(worker_type='fetch-feed').observe(len(feeds))
     logger.info('%d to enqueue', len(feeds))
-    for feed in feeds:
-        logger.debug("%r: scheduling to be fetched on queue:%r",
-                     feed, queue.value)
-        process_feed.apply_async(args=[feed.id], queue=queue.value)
+    if chunk_size > 1:
+        # feeds of a same url in the same chunk will share their fetch
+        feeds.sort(key=lambda feed: normalize_url(feed.link or ""))
+        for i in range(0, len(feeds), chunk_size):
+            feed_ids = [feed.id for feed in feeds[i:i + chunk_size]]
+            logger.debug("%d feeds: scheduling to be fetched on queue:%r",
+                         len(feed_ids), queue.value)
+            process_feeds.apply_async(args=[feed_ids], queue=queue.value)
+    else:
+        for feed, countdown in zip(feeds, countdowns):
+            logger.debug("%r: scheduling to be fetched on queue:%r in %ds",
+                         feed, queue.value, countdown)
+            process_feed.apply_async(args=[feed.id], queue=queue.value,
+                                     countdown=countdown)
     # browsing feeds to delete
     feeds_to_delete = list(fctrl.read(status=FeedStatus.to_delete))
     if feeds_to_delete and REDIS_CONN.setnx(JARR_FEED_DEL_KEY, 'true'):
@@ -114,6 +174,15 @@ def scheduler():
         for feed in feeds_to_delete:
             logger.debug("%r: scheduling to be delete", feed)
             feed_cleaner.apply_async(args=[feed.id])
+    # fetching pages of truncated feeds' articles ahead of clustering
+    queue = Queues.ENRICHING if conf.crawler.use_queues else Queues.DEFAULT
+    for user_id in ArticleController.get_user_id_with_articles_to_enrich():
+        if REDIS_CONN.setnx(JARR_ENRICHER_KEY % user_id, 'true'):
+            REDIS_CONN.expire(JARR_ENRICHER_KEY % user_id,
+                              conf.crawler.clusterizer_delay)
+            logger.debug('Scheduling enricher for User(%d) on queue:%r',
+                         user_id, queue.value)
+            enricher.apply_async(args=[user_id], queue=queue.value)
     # applying clusterizer
     queue = Queues.CLUSTERING if conf.crawler.use_queues else Queues.DEFAULT
     for user_id in ArticleController.get_user_id_with_pending_articles():
@@ -1,4 +1,9 @@
+import json
 import logging
+from base64 import b64decode, b64encode
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
 
 from jarr.lib.utils import digest
 
@@ -22,3 +27,30 @@ def response_calculated_etag_match(feed, resp):
                     feed, resp.status_code)
         return True
     return False
+
+
+def dump_response(response):
+    """Serialize what the crawlers use of a response."""
+    return json.dumps({'status_code': response.status_code,
+                       'url': response.url,
+                       'headers': dict(response.headers),
+                       'encoding': response.encoding,
+                       'content': b64encode(response.content).decode('ascii'),
+                       'history': [(previous.status_code, previous.url)
+                                   for previous in response.history]})
+
+
+def load_response(raw):
+    """Rebuild a response serialized by dump_response."""
+    dumped = json.loads(raw)
+    response = Response()
+    response.status_code = dumped['status_code']
+    response.url = dumped['url']
+    response.headers = CaseInsensitiveDict(dumped['headers'])
+    response.encoding = dumped['encoding']
+    response._content = b64decode(dumped['content'])
+    for status_code, url in dumped['history']:
+        previous = Response()
+        previous.status_code, previous.url = status_code, url
+        response.history.append(previous)
+    return response
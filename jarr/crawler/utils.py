@@ -1,14 +1,30 @@
+import asyncio
 import logging
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime
 from enum import Enum
 from functools import wraps
 from hashlib import sha256
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import advocate
+import requests
 
 from jarr.bootstrap import conf, REDIS_CONN
+from jarr.lib.utils import normalize_url
 from jarr.metrics import WORKER
 
 logger = logging.getLogger(__name__)
 LOCK_EXPIRE = 60 * 60
+JARR_HOST_THROTTLE_KEY = 'jarr.host-throttle.%s.%d'
+MAX_SESSIONS = 512
+_SESSIONS: OrderedDict[tuple[str, bool], requests.Session] = OrderedDict()
+_SESSIONS_LOCK = threading.Lock()
 
 
 def observe_worker_result_since(start, method, result):
@@ -20,6 +36,12 @@ class Queues(Enum):
     DEFAULT = conf.celery.task_default_queue
     CRAWLING = 'jarr-crawling'
     CLUSTERING = 'jarr-clustering'
+    ENRICHING = 'jarr-enriching'
+
+
+def _lock_key(prefix, args):
+    key = str(args).encode('utf8')
+    return f"lock-{prefix}-{sha256(key).hexdigest()}"
 
 
 def lock(prefix, expire=LOCK_EXPIRE):
@@ -27,8 +49,7 @@ def lock(prefix, expire=LOCK_EXPIRE):
         @wraps(func)
         def wrapper(args):
             start = datetime.now()
-            key = str(args).encode('utf8')
-            key = f"lock-{prefix}-{sha256(key).hexdigest()}"
+            key = _lock_key(prefix, args)
             if REDIS_CONN.setnx(key, 'locked'):
                 REDIS_CONN.expire(key, expire)
                 try:
@@ -45,3 +66,151 @@ def lock(prefix, expire=LOCK_EXPIRE):
                 observe_worker_result_since(start, prefix, 'skipped')
         return wrapper
     return metawrapper
+
+
+def acquire_locks(prefix, args_list, expire=LOCK_EXPIRE):
+    """Same locks as the ones set by the lock decorator, but acquired for
+    several arguments in a single round-trip to redis.
+
+    Will return the arguments for which the lock has been acquired.
+    """
+    pipe = REDIS_CONN.pipeline(transaction=False)
+    for args in args_list:
+        pipe.set(_lock_key(prefix, args), 'locked', nx=True, ex=expire)
+    return [args for args, acquired in zip(args_list, pipe.execute())
+            if acquired]
+
+
+def release_locks(prefix, args_list):
+    if args_list:
+        REDIS_CONN.delete(*(_lock_key(prefix, args) for args in args_list))
+
+
+def get_host(url):
+    return urlsplit(normalize_url(url or '')).netloc
+
+
+def get_session(url, ssrf_protect=True):
+    """Return the session used for every request to the host of url in this
+    process, so that connections are kept alive and reused.
+
+    Protected sessions are advocate ones, which validate the address of
+    each new connection as advocate.get does. Sessions are shared by the
+    feeds of every user and thus don't keep cookies. Only the MAX_SESSIONS
+    last used are kept, the others are closed.
+    """
+    key = get_host(url), ssrf_protect
+    with _SESSIONS_LOCK:
+        if key in _SESSIONS:
+            _SESSIONS.move_to_end(key)
+            return _SESSIONS[key]
+        session = advocate.Session() if ssrf_protect else requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        _SESSIONS[key] = session
+        while len(_SESSIONS) > MAX_SESSIONS:
+            _, evicted = _SESSIONS.popitem(last=False)
+            evicted.close()
+        return session
+
+
+class HostThrottle:
+    """Limit the number of requests started on a same host to `concurrency`
+    per `delay` seconds, and of those running at the same time.
+
+    The rate is also shared through redis with the other workers, which are
+    limited together to `concurrency` requests per `delay` seconds window.
+    """
+
+    def __init__(self, concurrency=None, delay=None):
+        self.concurrency = concurrency or conf.crawler.per_host_concurrency
+        self.delay = conf.crawler.per_host_delay if delay is None else delay
+        self._semaphores = defaultdict(
+            lambda: asyncio.Semaphore(self.concurrency))
+        self._starts = defaultdict(lambda: deque(maxlen=self.concurrency))
+
+    async def _wait_shared_window(self, host):
+        while self.delay:
+            now = time.time()
+            window = int(now // self.delay)
+            key = JARR_HOST_THROTTLE_KEY % (host, window)
+            pipe = REDIS_CONN.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, int(self.delay) + 1)
+            count, _ = pipe.execute()
+            if count <= self.concurrency:
+                return
+            await asyncio.sleep((window + 1) * self.delay - now)
+
+    @asynccontextmanager
+    async def slot(self, url):
+        host = get_host(url)
+        async with self._semaphores[host]:
+            starts, now = self._starts[host], asyncio.get_running_loop().time()
+            start = now
+            if len(starts) == self.concurrency:
+                start = max(now, starts[0] + self.delay)
+            starts.append(start)
+            if start > now:
+                await asyncio.sleep(start - now)
+            await self._wait_shared_window(host)
+            yield
+
+
+def get_dispatch_countdowns(urls, concurrency=None, delay=None,
+                            max_countdown=None):
+    """For urls about to be crawled in as many tasks, return the countdowns
+    to dispatch those tasks with, so that no more than `concurrency` tasks
+    hit a same host every `delay` seconds.
+
+    Tasks for an url already seen are delayed after the first one of that
+    url, so they can reuse its shared response. Tasks which would be delayed
+    more than `max_countdown` get None instead and are to be dispatched later.
+    """
+    concurrency = concurrency or conf.crawler.per_host_concurrency
+    delay = conf.crawler.per_host_delay if delay is None else delay
+    url_countdowns, host_counts, countdowns = {}, Counter(), []
+    for url in urls:
+        url = normalize_url(url or '')
+        if url in url_countdowns:
+            countdown = url_countdowns[url]
+            if countdown is not None:
+                countdown += delay
+        else:
+            host = get_host(url)
+            countdown = host_counts[host] // concurrency * delay
+            host_counts[host] += 1
+        if max_countdown is not None and countdown is not None \
+                and countdown > max_countdown:
+            countdown = None
+        url_countdowns.setdefault(url, countdown)
+        countdowns.append(countdown)
+    return countdowns
+
+
+def crawl_concurrently(crawlers, concurrency=None):
+    """Will crawl every given crawler with at most `concurrency` requests
+    in flight at once.
+
+    Network round-trips are awaited in a thread pool while responses are
+    processed one at a time in the calling thread, as soon as they arrive.
+    Crawlers of feeds pointing to the same resource share a single request
+    and requests to a same host are throttled (see HostThrottle).
+    An error on one feed won't prevent the others from being processed.
+    """
+    groups = defaultdict(list)
+    for crawler in crawlers:
+        groups[crawler.get_shared_fetch_key()].append(crawler)
+    groups = list(groups.values())
+    concurrency = concurrency or conf.crawler.concurrency
+
+    async def crawl_all():
+        semaphore, throttle = asyncio.Semaphore(concurrency), HostThrottle()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return await asyncio.gather(
+                *(leader.crawl_async(semaphore, executor, followers, throttle)
+                  for leader, *followers in groups),
+                return_exceptions=True)
+
+    for group, result in zip(groups, asyncio.run(crawl_all())):
+        if isinstance(result, Exception):
+            logger.error('%r: crawling failed with %r', group, result)
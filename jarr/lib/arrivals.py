@@ -0,0 +1,89 @@
+"""
+Model of the publication rate of a feed: a moving average of the time
+between two of its articles and the share of its articles published at
+each hour of the week. Both are updated as new articles arrive and used to
+guess when the next one is likely to be published.
+"""
+from datetime import timedelta
+from math import log
+
+HOURS_IN_WEEK = 7 * 24
+INTERVAL_WEIGHT = .3  # weight of the latest interval in the moving average
+PROFILE_HALF_LIFE = 4 * 7 * 24 * 3600  # seconds for the profile to halve
+PROFILE_SMOOTHING = .25  # share of the rate spread evenly across the week
+
+
+def hour_of_week(date):
+    return date.weekday() * 24 + date.hour
+
+
+def update_arrivals(interval, last_arrival, profile, dates):
+    """Fold the publication dates of new articles into the model.
+
+    Return the new (interval in seconds, last arrival, profile); dates
+    older than the last arrival are ignored.
+    """
+    profile = list(profile or [0.] * HOURS_IN_WEEK)
+    for date in sorted(dates):
+        if last_arrival is not None:
+            if date <= last_arrival:
+                continue
+            seconds = (date - last_arrival).total_seconds()
+            if interval is None:
+                interval = seconds
+            else:
+                interval = (INTERVAL_WEIGHT * seconds
+                            + (1 - INTERVAL_WEIGHT) * interval)
+            decay = .5 ** (seconds / PROFILE_HALF_LIFE)
+            profile = [weight * decay for weight in profile]
+        profile[hour_of_week(date)] += 1
+        last_arrival = date
+    return interval, last_arrival, profile
+
+
+def _walk(rates, start, end, seen=0):
+    """Return when an arrival becomes more likely than not, that is when
+    the arrivals expected from start sum to log(2), None if not before end.
+
+    seen is the number of arrivals already observed in the hour of start,
+    they account for as many of the arrivals expected in that hour.
+    """
+    expected, cursor = -seen, start
+    while cursor < end:
+        next_hour = (cursor + timedelta(hours=1)).replace(
+            minute=0, second=0, microsecond=0)
+        hours = (min(next_hour, end) - cursor).total_seconds() / 3600
+        rate = rates[hour_of_week(cursor)]
+        if expected + rate * hours >= log(2):
+            return cursor + timedelta(hours=(log(2) - expected) / rate)
+        expected = max(expected + rate * hours, 0)
+        cursor = next_hour
+    return None
+
+
+def predict_next_arrival(interval, last_arrival, profile, now, horizon):
+    """Return when the next article of a feed is expected, None if the
+    model lacks data or if it isn't expected before now + horizon.
+
+    If an article was expected before now, the silence since the last one
+    is taken as the interval, so that quiet feeds are fetched less often.
+    """
+    total = sum(profile or ())
+    if interval is None or last_arrival is None or not total:
+        return None
+
+    def get_rates(interval):
+        hourly = 3600 / max(interval, 1)  # mean arrivals per hour
+        return [hourly * (PROFILE_SMOOTHING + (1 - PROFILE_SMOOTHING)
+                          * HOURS_IN_WEEK * weight / total)
+                for weight in profile]
+
+    if last_arrival > now - horizon:
+        predicted = _walk(get_rates(interval), last_arrival, now + horizon,
+                          seen=1)
+    else:
+        predicted = _walk(get_rates(interval), now - horizon, now + horizon)
+    if predicted is None or predicted >= now:
+        return predicted
+    silence = (now - last_arrival).total_seconds()
+    return _walk(get_rates(max(interval, silence)), now, now + horizon)
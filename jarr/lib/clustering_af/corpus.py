@@ -0,0 +1,56 @@
+"""
+Lightweight representation of the articles a clusterizer compares new
+articles with. Only holds what's needed to find neighbors and score them,
+and can be serialized to be kept between clusterizer runs.
+"""
+import json
+from datetime import datetime
+
+
+class CorpusEntry:
+    """An already clustered article as seen by the clusterizer."""
+
+    __slots__ = ('id', 'cluster_id', 'feed_id', 'category_id', 'date',
+                 'retrieved_date', 'simple_vector', 'simple_vector_magnitude',
+                 'signature')
+
+    def __init__(self, id_, cluster_id, feed_id, category_id,
+                 date, retrieved_date, simple_vector, signature=None):
+        self.id = id_
+        self.cluster_id = cluster_id
+        self.feed_id = feed_id
+        self.category_id = category_id
+        self.date = date
+        self.retrieved_date = retrieved_date
+        self.simple_vector = simple_vector or {}
+        self.simple_vector_magnitude = sum(self.simple_vector.values())
+        self.signature = signature  # MinHash signature, see MinHashLSH
+
+    def __repr__(self):
+        return f"<CorpusEntry(feed_id={self.feed_id}, id={self.id})>"
+
+    @classmethod
+    def from_article(cls, article):
+        return cls(article.id, article.cluster_id, article.feed_id,
+                   article.category_id, article.date, article.retrieved_date,
+                   article.simple_vector)
+
+    def dumps(self):
+        return json.dumps([self.id, self.cluster_id, self.feed_id,
+                           self.category_id, self.date.isoformat(),
+                           self.retrieved_date.isoformat(),
+                           list(self.simple_vector),
+                           list(self.simple_vector.values()),
+                           self.signature])
+
+    @classmethod
+    def loads(cls, raw):
+        # entries cached before signatures were stored have 8 fields
+        (id_, cluster_id, feed_id, category_id, date, retrieved_date,
+         terms, counts, *signature) = json.loads(raw)
+        return cls(id_, cluster_id, feed_id, category_id,
+                   datetime.fromisoformat(date),
+                   datetime.fromisoformat(retrieved_date),
+                   dict(zip(terms, counts)),
+                   tuple(signature[0]) if signature and signature[0]
+                   else None)
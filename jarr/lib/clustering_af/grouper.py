@@ -3,62 +3,50 @@ Group articles that talks about the same subject.
 If two articles, in the same category, have enough similar tokens, we assume
 that they talk about the same subject, and we group them in a meta-article
 """
-from collections import OrderedDict
-from jarr.lib.clustering_af.vector import TFIDFVector
-from jarr.models.article import Article
+from jarr.lib.clustering_af.vector import TFIDFMatrix
 
 
-def get_cosine_similarity(left_vector: TFIDFVector,
-                          article: Article,
-                          term_frequencies: OrderedDict,
-                          corpus_size: int) -> float:
+def get_best_match_and_score(article, neighbors, candidates=None,
+                             tfidf_corpus=None):
     """
-    For a given vector and an article will return their cosine similarity.
-
     Parameter
     ---------
-    left_vector: lib.clustering_ad.vector.SparseVector
-        the vector of the main article
     article: models.article.Article
-    frequencies: dict
-        key = term in the corpus, value = number of document with that term
-    corpus_size: int
-        the total number of documents in the sample
-
-    """
-    right_vector = article.get_tfidf_vector(term_frequencies, corpus_size)
-    norms = left_vector.norm * right_vector.norm
-    if not norms:
-        return 0
-    return (left_vector * right_vector) / norms
-
-
-def get_terms_frequencies(*articles):
-    """
-    Parameter
-    ---------
-    articles: models.article objects
+    neighbors: list of models.article.Article
+        the corpus the article is compared with
+    candidates: set of article ids
+        if provided, only those neighbors will be scored, other are
+        considered as sharing no term with the article
+    tfidf_corpus: lib.clustering_af.vector.TFIDFCorpus
+        if provided, neighbors are scored from their rows in that corpus,
+        IDF being computed over that corpus (plus the article), instead of
+        encoding the article and its neighbors into a new matrix
 
     Return
     ------
-    dictionnary: {token: number of documents containing tokens}
+    the best matching neighbor and its score
     """
-    frequencies = OrderedDict()
-    for article in articles:
-        for term in article.simple_vector:
-            if term in frequencies:
-                frequencies[term] += 1
-            else:
-                frequencies[term] = 1
-    return frequencies
-
-
-def get_best_match_and_score(article, neighbors):
-    corpus_size = 1 + len(neighbors)  # current article + neighbors
-    term_frequencies = get_terms_frequencies(article, *neighbors)
-    vector = article.get_tfidf_vector(term_frequencies, corpus_size,
-                                      will_be_left_member=True)
-    rank = {get_cosine_similarity(vector, neighbor,
-                                  term_frequencies, corpus_size): neighbor
-            for neighbor in neighbors}
-    return rank[max(rank)], max(rank)
+    if tfidf_corpus is not None:
+        doc_ids = [neighbor.id for neighbor in neighbors
+                   if (candidates is None or neighbor.id in candidates)
+                   and neighbor.id in tfidf_corpus]
+        scores = dict(tfidf_corpus.get_cosine_similarities(
+            article.simple_vector, article.simple_vector_magnitude,
+            doc_ids, article.id))
+        keys = (neighbor.id for neighbor in neighbors)
+    else:
+        # current article is the first row of the matrix, then neighbors
+        matrix = TFIDFMatrix(
+            (doc.simple_vector, doc.simple_vector_magnitude)
+            for doc in (article, *neighbors))
+        rows = [row for row, neighbor in enumerate(neighbors, 1)
+                if candidates is None or neighbor.id in candidates]
+        scores = dict(matrix.get_cosine_similarities(0, rows))
+        keys = range(1, len(neighbors) + 1)
+    best_match, best_score = None, None
+    for key, neighbor in zip(keys, neighbors):
+        score = scores.get(key, 0)
+        # on equal scores, the last neighbor wins
+        if best_score is None or score >= best_score:
+            best_match, best_score = neighbor, score
+    return best_match, best_score
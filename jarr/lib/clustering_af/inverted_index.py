@@ -0,0 +1,71 @@
+"""
+Inverted index over the terms of a corpus.
+Allows to only compare an article with the documents it shares terms with,
+instead of the whole corpus, and maintains the document frequencies of the
+corpus as documents are added or removed.
+"""
+from collections import Counter, defaultdict
+
+# terms held by no more documents than this are never too common to count
+MIN_COMMON_TERM_POSTINGS = 10
+
+
+class InvertedIndex:
+    """Map each term to the ids of the documents containing it."""
+
+    def __init__(self):
+        self.postings = defaultdict(set)
+        self.doc_ids = set()
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def add(self, doc_id, terms):
+        """Index the terms of a document, a document is only indexed once."""
+        if doc_id in self.doc_ids:
+            return
+        self.doc_ids.add(doc_id)
+        for term in terms or ():
+            self.postings[term].add(doc_id)
+
+    def remove(self, doc_id, terms):
+        if doc_id not in self.doc_ids:
+            return
+        self.doc_ids.remove(doc_id)
+        for term in terms or ():
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.discard(doc_id)
+            if not postings:
+                del self.postings[term]
+
+    def document_frequency(self, term):
+        """Return the number of indexed documents containing term."""
+        postings = self.postings.get(term)
+        return len(postings) if postings else 0
+
+    def get_candidates(self, terms, min_shared_terms=1,
+                       common_term_ratio=1.):
+        """Return the ids of the documents sharing enough terms.
+
+        Parameters
+        ----------
+        terms: iterable
+            the terms of the document to find candidates for
+        min_shared_terms: int
+            minimum number of terms a document must share to be a candidate
+        common_term_ratio: float
+            terms held by more than this ratio of the indexed documents
+            (and by more than MIN_COMMON_TERM_POSTINGS documents) aren't
+            rare enough to be counted
+        """
+        max_postings = max(common_term_ratio * len(self.doc_ids),
+                           MIN_COMMON_TERM_POSTINGS)
+        shared = Counter()
+        for term in terms or ():
+            postings = self.postings.get(term)
+            if postings and len(postings) <= max_postings:
+                shared.update(postings)
+        return {doc_id for doc_id, count in shared.items()
+                if count >= min_shared_terms}
@@ -0,0 +1,100 @@
+"""
+MinHash signatures and locality-sensitive hashing over the terms of a corpus.
+Allows to find near-duplicates of an article (syndicated copies of a same
+story for example) without scoring it against the whole corpus.
+"""
+from collections import defaultdict
+from hashlib import blake2b
+from random import Random
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def _hash_term(term):
+    return int.from_bytes(blake2b(term.encode('utf8'),
+                                  digest_size=4).digest(), 'big')
+
+
+class MinHashLSH:
+    """Index documents' MinHash signatures by bands.
+
+    Two documents whose signatures are identical on at least one band are
+    candidates, their similarity is then estimated as the ratio of equal
+    values in their signatures, an estimation of the Jaccard index of their
+    sets of terms.
+    """
+
+    def __init__(self, permutations=64, bands=16, seed=1):
+        if permutations % bands:
+            raise ValueError("permutations must be a multiple of bands")
+        self.permutations = permutations
+        self.band_size = permutations // bands
+        random = Random(seed)
+        self._permutations = [(random.randint(1, MERSENNE_PRIME - 1),
+                               random.randint(0, MERSENNE_PRIME - 1))
+                              for _ in range(permutations)]
+        self.buckets = defaultdict(set)
+        self.signatures = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def signature(self, terms):
+        """Return the MinHash signature of a set of terms, None if empty."""
+        hashes = [_hash_term(term) for term in terms or ()]
+        if not hashes:
+            return None
+        return tuple(min(((a * hash_ + b) % MERSENNE_PRIME) & MAX_HASH
+                         for hash_ in hashes)
+                     for a, b in self._permutations)
+
+    def _bands(self, signature):
+        for index in range(0, len(signature), self.band_size):
+            yield index, signature[index:index + self.band_size]
+
+    def add(self, doc_id, terms, signature=None):
+        """Index the signature of a document, a document is indexed once.
+
+        The signature is computed from terms unless given, as returned by
+        MinHashLSH.signature with the same permutations and seed."""
+        if doc_id in self.signatures:
+            return
+        if signature is None:
+            signature = self.signature(terms)
+        if signature is None:
+            return
+        self.signatures[doc_id] = signature
+        for band in self._bands(signature):
+            self.buckets[band].add(doc_id)
+
+    def remove(self, doc_id):
+        signature = self.signatures.pop(doc_id, None)
+        if signature is None:
+            return
+        for band in self._bands(signature):
+            bucket = self.buckets.get(band)
+            if bucket is None:
+                continue
+            bucket.discard(doc_id)
+            if not bucket:
+                del self.buckets[band]
+
+    def query(self, terms, min_score=0.):
+        """Yield ids of indexed documents sharing a band with the given terms
+        and their estimated similarity if above min_score, best first."""
+        signature = self.signature(terms)
+        if signature is None:
+            return
+        candidates = set()
+        for band in self._bands(signature):
+            candidates.update(self.buckets.get(band, ()))
+        scores = []
+        for doc_id in candidates:
+            other = self.signatures[doc_id]
+            score = sum(1 for left, right in zip(signature, other)
+                        if left == right) / len(signature)
+            if score >= min_score:
+                scores.append((doc_id, score))
+        scores.sort(key=lambda doc_score: doc_score[1], reverse=True)
+        yield from scores
@@ -1,3 +1,4 @@
+from array import array
 from math import log10, sqrt
 from functools import lru_cache
 from collections import OrderedDict
@@ -91,6 +92,176 @@ class TFIDFVector(SparseVector):
                              will_be_left_member)
 
 
+class TFIDFMatrix:
+    """
+    A corpus represented as a sparse matrix, in a CSR fashion.
+
+    Terms are encoded once into integer ids, each row holds the ids and
+    frequencies of the terms of one document and IDF is computed once per
+    term. Scoring a document against others loops over the non-zero values
+    of their rows only, where a TFIDFVector spans the whole vocabulary.
+    """
+
+    def __init__(self, documents, document_frequency=None,
+                 corpus_size=None):
+        """
+        Parameters
+        ----------
+        documents: iterable
+            for each document, a tuple of a dict (key = term, value = count
+            in the document) and the total count of terms in the document
+        document_frequency: callable
+            if provided, will be given a term and return the number of
+            documents containing it in the corpus, instead of counting it
+            in the given documents
+        corpus_size: int
+            the total number of documents in the corpus, defaults to the
+            number of given documents
+        """
+        self.vocabulary = {}
+        self.indptr = array('L', [0])
+        self.indices = array('L')
+        self.data = array('d')  # term frequencies
+        document_counts = array('L')
+        for document, document_size in documents:
+            for term, count in (document or {}).items():
+                term_id = self.vocabulary.get(term)
+                if term_id is None:
+                    term_id = self.vocabulary[term] = len(document_counts)
+                    document_counts.append(0)
+                document_counts[term_id] += 1
+                self.indices.append(term_id)
+                self.data.append(count / document_size)
+            self.indptr.append(len(self.indices))
+        if document_frequency is not None:
+            document_counts = array('L', (document_frequency(term)
+                                          for term in self.vocabulary))
+        corpus_size = corpus_size or len(self)
+        self.idf = array('d', (log10(corpus_size / (1 + document_count))
+                               for document_count in document_counts))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def _iter_row(self, row):
+        start, end = self.indptr[row], self.indptr[row + 1]
+        idf = self.idf
+        for term_id, term_frequency in zip(self.indices[start:end],
+                                           self.data[start:end]):
+            yield term_id, term_frequency * idf[term_id]
+
+    def get_cosine_similarities(self, row, others=None):
+        """Will yield each row of others along with its cosine similarity
+        with row. Others defaults to every row of the matrix."""
+        weights = dict(self._iter_row(row))
+        norm = sqrt(sum(pow(weight, 2) for weight in weights.values()))
+        for other in range(len(self)) if others is None else others:
+            product, other_norm = 0, 0
+            for term_id, weight in self._iter_row(other):
+                other_norm += pow(weight, 2)
+                if term_id in weights:
+                    product += weights[term_id] * weight
+            norms = norm * sqrt(other_norm)
+            yield other, product / norms if norms else 0
+
+
+class TFIDFCorpus:
+    """
+    A corpus kept as a sparse matrix, documents being added and removed as
+    the corpus changes.
+
+    As in TFIDFMatrix, terms are encoded into integer ids and each row holds
+    the ids and frequencies of the terms of one document. Rows are indexed
+    by document id and the number of documents containing each term is
+    maintained, so that a new document can be scored against some rows
+    without encoding the corpus again.
+    """
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.rows = {}
+        self._terms = []  # term of each id, None if the id is free
+        self._free_ids = []
+        self._document_counts = array('L')
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.rows
+
+    def add(self, doc_id, document, document_size):
+        """Add a row for a document, a document is only added once."""
+        if doc_id in self.rows:
+            return
+        indices, data = array('L'), array('d')
+        for term, count in (document or {}).items():
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                if self._free_ids:
+                    term_id = self._free_ids.pop()
+                    self._terms[term_id] = term
+                else:
+                    term_id = len(self._terms)
+                    self._terms.append(term)
+                    self._document_counts.append(0)
+                self.vocabulary[term] = term_id
+            self._document_counts[term_id] += 1
+            indices.append(term_id)
+            data.append(count / document_size)
+        self.rows[doc_id] = indices, data
+
+    def remove(self, doc_id):
+        indices, _ = self.rows.pop(doc_id, ((), ()))
+        for term_id in indices:
+            self._document_counts[term_id] -= 1
+            if not self._document_counts[term_id]:
+                del self.vocabulary[self._terms[term_id]]
+                self._terms[term_id] = None
+                self._free_ids.append(term_id)
+
+    def document_frequency(self, term):
+        """Return the number of documents of the corpus containing term."""
+        term_id = self.vocabulary.get(term)
+        return 0 if term_id is None else self._document_counts[term_id]
+
+    def get_cosine_similarities(self, document, document_size, doc_ids,
+                                doc_id=None):
+        """Will yield each of doc_ids along with the cosine similarity of
+        its row with the given document.
+
+        Unless doc_id is the id of a document of the corpus, IDF is computed
+        as if the given document was part of the corpus.
+        """
+        counted = doc_id is None or doc_id not in self.rows
+        corpus_size = len(self.rows) + counted
+        weights, norm = {}, 0
+        for term, count in (document or {}).items():
+            idf = log10(corpus_size
+                        / (1 + self.document_frequency(term) + counted))
+            weight = count / document_size * idf
+            norm += pow(weight, 2)
+            term_id = self.vocabulary.get(term)
+            if term_id is not None:
+                weights[term_id] = weight
+        norm = sqrt(norm)
+        idf_cache = {}
+        for other in doc_ids:
+            product, other_norm = 0, 0
+            for term_id, term_frequency in zip(*self.rows[other]):
+                idf = idf_cache.get(term_id)
+                if idf is None:
+                    idf = idf_cache[term_id] = log10(
+                        corpus_size / (1 + self._document_counts[term_id]
+                                       + (counted and term_id in weights)))
+                weight = term_frequency * idf
+                other_norm += pow(weight, 2)
+                if term_id in weights:
+                    product += weights[term_id] * weight
+            norms = norm * sqrt(other_norm)
+            yield other, product / norms if norms else 0
+
+
 @lru_cache()
 def get_simple_vector(vector):
     if vector is None:
@@ -1,19 +1,24 @@
+import json
 import logging
 import re
 import urllib.parse
 from functools import lru_cache
+from types import SimpleNamespace
 from typing import Optional
 
 from goose3 import Goose
-from jarr.bootstrap import conf
+from jarr.bootstrap import REDIS_CONN, conf
 from jarr.controllers.article import to_vector
 from jarr.lib.enums import ArticleType, FeedType
 from jarr.lib.html_parsing import clean_article_content
+from jarr.lib.link_resolution import get_resolution
 from jarr.lib.url_cleaners import remove_utm_tags
-from jarr.lib.utils import clean_lang
+from jarr.lib.utils import clean_lang, digest
 
 logger = logging.getLogger(__name__)
 IMG_ALT_MAX_LENGTH = 100
+JARR_EXTRACTION_KEY = "jarr.extraction.%s"
+JARR_EXTRACTION_FAILURE_KEY = "jarr.extraction.%s.failed"
 YOUTUBE_RE = re.compile(
     r"^((?:https?:)?\/\/)?((?:www|m)\.)?((?:youtube\.com|youtu.be))"
     r"(\/(?:[\w\-]+\?v=|embed\/|v\/)?)([\w\-]+)(\S+)?$"
@@ -29,6 +34,51 @@ def get_embedded_id(link):
         return match.group(5)
 
 
+def _get_extraction_ttl():
+    # without sharing, pages are kept until the enriched articles are clustered
+    return (conf.crawler.extraction_cache_ttl
+            or conf.clustering.enrichment_timeout)
+
+
+def get_extracted_page(link):
+    """Return the page extracted from link for another article, if any,
+    holding the attributes of a goose article the generators rely on."""
+    if not _get_extraction_ttl():
+        return None
+    raw = REDIS_CONN.get(JARR_EXTRACTION_KEY % digest(link))
+    if raw is None:
+        return None
+    return SimpleNamespace(**json.loads(raw))
+
+
+def set_extracted_page(link, page):
+    if not _get_extraction_ttl():
+        return
+    extracted = {"final_url": page.final_url, "title": page.title,
+                 "tags": sorted(page.tags), "meta_lang": page.meta_lang,
+                 "meta_keywords": page.meta_keywords,
+                 "opengraph": {"locale": page.opengraph.get("locale")},
+                 "cleaned_text": page.cleaned_text,
+                 "top_node_raw_html": clean_article_content(
+                     page.top_node_raw_html)}
+    REDIS_CONN.set(JARR_EXTRACTION_KEY % digest(link), json.dumps(extracted),
+                   ex=_get_extraction_ttl())
+
+
+def is_extraction_failing(link):
+    """Whether extracting the page of link recently failed."""
+    if not conf.crawler.extraction_failure_ttl:
+        return False
+    return bool(REDIS_CONN.exists(JARR_EXTRACTION_FAILURE_KEY % digest(link)))
+
+
+def set_extraction_failure(link):
+    if not conf.crawler.extraction_failure_ttl:
+        return
+    REDIS_CONN.set(JARR_EXTRACTION_FAILURE_KEY % digest(link), 1,
+                   ex=conf.crawler.extraction_failure_ttl)
+
+
 class ContentGenerator:
     article_type: Optional[ArticleType] = None
     feed_type: Optional[FeedType] = None
@@ -39,12 +89,24 @@ class ContentGenerator:
         self.extracted_infos = {}
 
     def _get_goose(self):
-        goose = Goose({"browser_user_agent": conf.crawler.user_agent})
-        try:
-            self._page = goose.extract(self.article.link)
-        except Exception as error:
-            msg = "something wrong happened while trying to fetch %r: %r"
-            logger.error(msg, self.article.link, error)
+        resolution = get_resolution(self.article.link)
+        # skipping redirects if the link has already been resolved
+        link = (resolution or {}).get("url") or self.article.link
+        if is_extraction_failing(link):
+            logger.info("%r: not extracting %r, known to fail",
+                        self.article, link)
+            return False
+        self._page = get_extracted_page(link)
+        if self._page is None:
+            goose = Goose({"browser_user_agent": conf.crawler.user_agent})
+            try:
+                self._page = goose.extract(link)
+            except Exception as error:
+                msg = "something wrong happened while trying to fetch %r: %r"
+                logger.error(msg, self.article.link, error)
+                set_extraction_failure(link)
+            else:
+                set_extracted_page(link, self._page)
         if not self._page:
             return False
         lang = self._page.opengraph.get("locale") or self._page.meta_lang
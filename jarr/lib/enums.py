@@ -33,6 +33,8 @@ class ClusterReason(Enum):
     # the article has the same link that the main one of the cluster
     link = 'link'
     tf_idf = 'tf_idf'  # the article has been clustered through tf_idf
+    # the article is a near-duplicate found through MinHash signatures
+    minhash = 'minhash'
 
 
 class ReadReason(Enum):
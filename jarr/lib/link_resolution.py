@@ -0,0 +1,43 @@
+"""
+Resolution of article links, kept in redis and shared by every user: the
+final url a link redirects to, what its response headers tell about it and
+the hash articles are clustered on. Links failing to resolve are remembered
+as well, for a shorter time.
+"""
+import json
+import logging
+
+from jarr.bootstrap import REDIS_CONN, conf
+from jarr.lib.utils import digest
+
+logger = logging.getLogger(__name__)
+JARR_LINK_KEY = "jarr.link.%s"
+
+
+def make_resolution(url, content_type=None, content_language=None,
+                    link_hash=None):
+    return {"url": url, "content_type": content_type,
+            "content_language": content_language,
+            "link_hash": link_hash.hex() if link_hash else None}
+
+
+def get_resolution(link):
+    """Return the cached resolution of link, an empty dict if it is known
+    to fail and None if it isn't known."""
+    if not conf.crawler.head_cache_ttl:
+        return None
+    raw = REDIS_CONN.get(JARR_LINK_KEY % digest(link))
+    if raw is None:
+        return None
+    return json.loads(raw)
+
+
+def set_resolution(link, resolution):
+    """Keep the resolution of link, an empty dict marking a failure."""
+    ttl = conf.crawler.head_cache_ttl if resolution \
+        else conf.crawler.head_failure_ttl
+    if not conf.crawler.head_cache_ttl or not ttl:
+        return
+    logger.debug("caching resolution of %r: %r", link, resolution)
+    REDIS_CONN.set(JARR_LINK_KEY % digest(link), json.dumps(resolution),
+                   ex=ttl)
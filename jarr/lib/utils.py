@@ -17,6 +17,9 @@ LANG_FORMAT = re.compile("^[a-z]{2}(_[A-Z]{2})?$")
 CORRECTABLE_LANG_FORMAT = re.compile("^[A-z]{2}(.[A-z]{2})?.*$")
 LANG_FORMAT = re.compile(r"^[a-z]{2}(_[A-Z]{2})?$")
 CORRECTABLE_LANG_FORMAT = re.compile(r"^[A-z]{2}(.[A-z]{2})?.*$")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+NON_WORD = re.compile(r"[^\w\s]+")
+TITLE_HASH_MIN_WORDS = 3
 PRIVATE_IP = re.compile(
     r"(^127\.)|(^192\.168\.)|(^10\.)|(^172\.1[6-9]\.)|(^172\.2[0-9]\.)|"
     r"(^172\.3[0-1]\.)|(^::1$)|(^[fF][cCdD])"
@@ -83,23 +86,57 @@ def rebuild_url(url, base_split):
     return urllib.parse.urlunsplit(new_split)
 
 
+def normalize_url(url):
+    """Return url without what doesn't change the resource it locates:
+    case of scheme and host, default port and fragment."""
+    split = urllib.parse.urlsplit(url.strip())
+    scheme = split.scheme.lower()
+    try:
+        port = split.port
+    except ValueError:
+        return url
+    netloc = split.hostname or ""
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+    if "@" in split.netloc:
+        netloc = f"{split.netloc.rsplit('@', 1)[0]}@{netloc}"
+    return urllib.parse.urlunsplit(
+        (scheme, netloc, split.path or "/", split.query, "")
+    )
+
+
 def digest(text, alg="md5", out="str", encoding="utf8"):
     method = md5 if alg == "md5" else sha1
     text = text.encode(encoding) if hasattr(text, "encode") else text
     return getattr(method(text), "hexdigest" if out == "str" else "digest")()
 
 
+def title_hash(title):
+    """Return the sha1 of a title lowercased, stripped of punctuation and
+    extra whitespace, None if it is too short to tell articles apart."""
+    words = NON_WORD.sub(" ", (title or "").lower()).split()
+    if len(words) < TITLE_HASH_MIN_WORDS:
+        return None
+    return digest(" ".join(words), alg="sha1", out="bytes")
+
+
 def jarr_get(
     url,
     timeout=None,
     user_agent=None,
     headers=None,
     ssrf_protect=True,
+    session=None,
     **kwargs,
 ):
+    """Will GET url, through session if provided, else through advocate
+    unless ssrf_protect is False. Sessions are expected to enforce the same
+    protection (see jarr.crawler.utils.get_session)."""
     from jarr.bootstrap import conf  # prevent circular import
 
-    if ssrf_protect:
+    if session is not None:
+        http_get = session.get
+    elif ssrf_protect:
         http_get = advocate.get
     else:
         http_get = requests.get
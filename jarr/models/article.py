@@ -5,9 +5,10 @@ from jarr.lib.clustering_af.vector import TFIDFVector, get_simple_vector
 from jarr.lib.enums import ArticleType, ClusterReason
 from jarr.lib.utils import utc_now
 from jarr.models.utc_datetime_type import UTCDateTime
-from sqlalchemy import (Column, Enum, ForeignKeyConstraint, Index, Integer,
-                        LargeBinary, PickleType, String)
-from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy import (DDL, Boolean, Column, Enum, FetchedValue,
+                        ForeignKeyConstraint, Index, Integer, LargeBinary,
+                        PickleType, String, event)
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from sqlalchemy.orm import relationship
 
 
@@ -20,6 +21,7 @@ class Article(Base):  # type: ignore
     link = Column(String)
     link_hash = Column(LargeBinary)
     title = Column(String)
+    title_hash = Column(LargeBinary)
     content = Column(String)
     comments = Column(String)
     lang = Column(String)
@@ -31,10 +33,22 @@ class Article(Base):  # type: ignore
     article_type = Column(
         Enum(ArticleType), default=None, nullable=True
     )  # type: ignore
+    # false until the page of an article of a truncated feed is fetched
+    enriched = Column(Boolean, default=True)
 
     # parsing
     tags = Column(PickleType, default=[])
     vector = Column(TSVECTOR)
+    # lexemes of vector and their number of occurrences, in the same order,
+    # set by the database from vector (see SIMPLE_VECTOR_TRIGGER)
+    vector_terms: Column[list] = Column(
+        ARRAY(String), server_default=FetchedValue(),
+        server_onupdate=FetchedValue()
+    )
+    vector_counts: Column[list] = Column(
+        ARRAY(Integer), server_default=FetchedValue(),
+        server_onupdate=FetchedValue()
+    )
     # reasons
     cluster_reason = Column(Enum(ClusterReason), default=None)  # type: ignore
     cluster_score = Column(Integer, default=None)
@@ -77,6 +91,7 @@ class Article(Base):  # type: ignore
         Index("ix_article_uid_cid_cluid", user_id, category_id, cluster_id),
         Index("ix_article_uid_fid_eid", user_id, feed_id, entry_id),
         Index("ix_article_uid_cid_linkh", user_id, category_id, link_hash),
+        Index("ix_article_uid_cid_titleh", user_id, category_id, title_hash),
         Index("ix_article_retrdate", retrieved_date),
     )
 
@@ -85,18 +100,29 @@ class Article(Base):  # type: ignore
         return f"<Article(feed_id={self.feed_id}, id={self.id})>"
 
     # TFIDF vectors
+    def _get_simple_vector(self):
+        terms, counts = self.vector_terms, self.vector_counts
+        if not isinstance(terms, list) or not isinstance(counts, list):
+            # not computed yet, parsing the text form of the tsvector
+            return get_simple_vector(self.vector)
+        cached = getattr(self, "_simple_vector_cache", None)
+        if cached is None or cached[0] is not terms:
+            cached = terms, (dict(zip(terms, counts)), sum(counts))
+            self._simple_vector_cache = cached
+        return cached[1]
+
     @property
     def simple_vector(self):
-        return get_simple_vector(self.vector)[0]
+        return self._get_simple_vector()[0]
 
     @property
     def simple_vector_magnitude(self):
-        return get_simple_vector(self.vector)[1]
+        return self._get_simple_vector()[1]
 
     def get_tfidf_vector(
         self, frequencies, corpus_size, will_be_left_member=False
     ):
-        vector, size = get_simple_vector(self.vector)
+        vector, size = self._get_simple_vector()
         return TFIDFVector(
             vector,
             size,
@@ -110,3 +136,30 @@ class Article(Base):  # type: ignore
         from jarr.lib.content_generator import get_content_generator
 
         return get_content_generator(self)
+
+
+SIMPLE_VECTOR_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION article_simple_vector() RETURNS trigger AS $$
+BEGIN
+    IF NEW.vector IS NULL THEN
+        NEW.vector_terms := NULL;
+        NEW.vector_counts := NULL;
+        RETURN NEW;
+    END IF;
+    SELECT coalesce(array_agg(lexeme ORDER BY lexeme), '{}'),
+           coalesce(array_agg(coalesce(array_length(positions, 1), 1)
+                              ORDER BY lexeme), '{}')
+    INTO NEW.vector_terms, NEW.vector_counts
+    FROM unnest(NEW.vector);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql""")
+SIMPLE_VECTOR_TRIGGER = DDL(
+    "CREATE TRIGGER article_simple_vector "
+    "BEFORE INSERT OR UPDATE OF vector ON article "
+    "FOR EACH ROW EXECUTE PROCEDURE article_simple_vector()"
+)
+event.listen(Article.__table__, "after_create",
+             SIMPLE_VECTOR_FUNCTION.execute_if(dialect="postgresql"))
+event.listen(Article.__table__, "after_create",
+             SIMPLE_VECTOR_TRIGGER.execute_if(dialect="postgresql"))
@@ -44,6 +44,11 @@ class Feed(Base):  # type: ignore
     last_retrieved = Column(UTCDateTime, default=UNIX_START)
     expires = Column(UTCDateTime, default=UNIX_START)
 
+    # publication rate model, see jarr.lib.arrivals
+    arrival_interval = Column(Integer, default=None, nullable=True)
+    last_arrival = Column(UTCDateTime, default=None, nullable=True)
+    arrival_profile = Column(PickleType, default=None, nullable=True)
+
     # error logging
     last_error = Column(String, default="")
     error_count = Column(Integer, default=0)
@@ -75,6 +80,11 @@ class Feed(Base):  # type: ignore
         ForeignKeyConstraint([icon_url], ["icon.url"]),
         Index("ix_feed_uid", user_id),
         Index("ix_feed_uid_cid", user_id, category_id),
+        # partial indexes on what makes an active feed late, see list_late
+        Index("ix_feed_active_expires", expires,
+              postgresql_where=status == FeedStatus.active),
+        Index("ix_feed_active_lretrieved", last_retrieved,
+              postgresql_where=status == FeedStatus.active),
     )
 
     def __repr__(self):
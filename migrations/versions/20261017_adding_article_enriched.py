@@ -0,0 +1,30 @@
+"""Adding `Article.enriched` column
+
+Revision ID: 5d9e2c7b4a10
+Revises: 8e41f0a7c2d3
+Create Date: 2026-10-17 14:32:11.418302
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5d9e2c7b4a10'
+down_revision = '8e41f0a7c2d3'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('article', sa.Column('enriched', sa.Boolean(),
+                                       nullable=True, default=True,
+                                       server_default=sa.true()))
+    # articles of truncated feeds still waiting to be clustered
+    op.execute("UPDATE article SET enriched = false FROM feed "
+               "WHERE article.feed_id = feed.id "
+               "AND feed.truncated_content AND article.cluster_id IS NULL")
+
+
+def downgrade():
+    op.drop_column('article', 'enriched')
@@ -0,0 +1,60 @@
+"""Adding `Article.title_hash` column and index
+
+Revision ID: 9a4c6e1f3b27
+Revises: 7b2e9d4c1a68
+Create Date: 2026-10-17 18:40:27.163590
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9a4c6e1f3b27'
+down_revision = '7b2e9d4c1a68'
+branch_labels = None
+depends_on = None
+
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+from jarr.lib.utils import title_hash
+
+logger = logging.getLogger('alembic.' + revision)
+HISTORY = '20 days'  # default clustering.time_delta
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    op.add_column('article', sa.Column('title_hash', sa.LargeBinary(),
+                                       nullable=True))
+    logger.info('hashing titles of articles clustering may compare with')
+    article = sa.table('article', sa.column('id', sa.Integer()),
+                       sa.column('title_hash', sa.LargeBinary()))
+    update = (article.update()
+              .where(article.c.id == sa.bindparam('article_id'))
+              .values(title_hash=sa.bindparam('hashed')))
+    select = sa.text(
+        "SELECT id, title FROM article WHERE title IS NOT NULL "
+        "AND retrieved_date > now() at time zone 'utc' - interval '%s' "
+        "AND id > :last_id ORDER BY id LIMIT :limit" % HISTORY)
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(select, {'last_id': last_id,
+                                     'limit': BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        hashes = [{'article_id': article_id, 'hashed': title_hash(title)}
+                  for article_id, title in rows]
+        hashes = [values for values in hashes if values['hashed']]
+        if hashes:
+            conn.execute(update, hashes)
+        logger.info('hashed titles up to article %d', last_id)
+    op.create_index('ix_article_uid_cid_titleh', 'article',
+                    ['user_id', 'category_id', 'title_hash'])
+
+
+def downgrade():
+    op.drop_index('ix_article_uid_cid_titleh', table_name='article')
+    op.drop_column('article', 'title_hash')
@@ -0,0 +1,61 @@
+"""Adding `Feed.arrival_interval`, `last_arrival` and `arrival_profile`
+
+Revision ID: 1f6a3b8d2e95
+Revises: 5d9e2c7b4a10
+Create Date: 2026-10-17 16:05:48.730126
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1f6a3b8d2e95'
+down_revision = '5d9e2c7b4a10'
+branch_labels = None
+depends_on = None
+
+import logging
+from datetime import timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from jarr.lib.arrivals import update_arrivals
+
+logger = logging.getLogger('alembic.' + revision)
+HISTORY = '14 days'  # twice the default max_expires
+
+
+def upgrade():
+    op.add_column('feed', sa.Column('arrival_interval', sa.Integer(),
+                                    nullable=True))
+    op.add_column('feed', sa.Column('last_arrival', sa.DateTime(),
+                                    nullable=True))
+    op.add_column('feed', sa.Column('arrival_profile', sa.PickleType(),
+                                    nullable=True))
+    logger.info('building publication models from recent articles')
+    feed = sa.table('feed', sa.column('id', sa.Integer()),
+                    sa.column('arrival_interval', sa.Integer()),
+                    sa.column('last_arrival', sa.DateTime()),
+                    sa.column('arrival_profile', sa.PickleType()))
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT feed_id, date FROM article WHERE date IS NOT NULL "
+        "AND date > now() at time zone 'utc' - interval '%s' "
+        "AND date <= now() at time zone 'utc' "
+        "ORDER BY feed_id, date" % HISTORY))
+    dates_by_feed = {}
+    for feed_id, date in rows:
+        dates_by_feed.setdefault(feed_id, []).append(
+            date.replace(tzinfo=timezone.utc))
+    for feed_id, dates in dates_by_feed.items():
+        interval, last_arrival, profile = update_arrivals(None, None, None,
+                                                          dates)
+        conn.execute(feed.update().where(feed.c.id == feed_id).values(
+            arrival_interval=None if interval is None else round(interval),
+            last_arrival=last_arrival.replace(tzinfo=None),
+            arrival_profile=profile))
+
+
+def downgrade():
+    op.drop_column('feed', 'arrival_profile')
+    op.drop_column('feed', 'last_arrival')
+    op.drop_column('feed', 'arrival_interval')
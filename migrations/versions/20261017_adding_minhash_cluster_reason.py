@@ -0,0 +1,26 @@
+"""Adding `minhash` as a cluster reason
+
+Revision ID: 8e41f0a7c2d3
+Revises: 3c5b2d1e9a47
+Create Date: 2026-10-17 14:03:27.694512
+
+"""
+import logging
+
+from alembic import op
+
+revision = '8e41f0a7c2d3'
+down_revision = '3c5b2d1e9a47'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger('alembic.' + revision)
+
+
+def upgrade():
+    logger.info('adding minhash as a possible cluster reason')
+    op.execute("ALTER TYPE clusterreason ADD VALUE IF NOT EXISTS 'minhash';")
+
+
+def downgrade():
+    pass
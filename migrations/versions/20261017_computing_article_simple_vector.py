@@ -0,0 +1,42 @@
+"""Computing `Article.vector_terms` and `vector_counts` with a trigger
+
+Revision ID: 4e8a1c7d5b02
+Revises: 9a4c6e1f3b27
+Create Date: 2026-10-17 19:52:16.408213
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4e8a1c7d5b02'
+down_revision = '9a4c6e1f3b27'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+
+
+def upgrade():
+    op.execute("""
+CREATE OR REPLACE FUNCTION article_simple_vector() RETURNS trigger AS $$
+BEGIN
+    IF NEW.vector IS NULL THEN
+        NEW.vector_terms := NULL;
+        NEW.vector_counts := NULL;
+        RETURN NEW;
+    END IF;
+    SELECT coalesce(array_agg(lexeme ORDER BY lexeme), '{}'),
+           coalesce(array_agg(coalesce(array_length(positions, 1), 1)
+                              ORDER BY lexeme), '{}')
+    INTO NEW.vector_terms, NEW.vector_counts
+    FROM unnest(NEW.vector);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql""")
+    op.execute("CREATE TRIGGER article_simple_vector "
+               "BEFORE INSERT OR UPDATE OF vector ON article "
+               "FOR EACH ROW EXECUTE PROCEDURE article_simple_vector()")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER article_simple_vector ON article")
+    op.execute("DROP FUNCTION article_simple_vector()")
@@ -0,0 +1,28 @@
+"""Indexing `Feed.expires` and `last_retrieved` of active feeds
+
+Revision ID: 7b2e9d4c1a68
+Revises: 1f6a3b8d2e95
+Create Date: 2026-10-17 17:21:09.584412
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7b2e9d4c1a68'
+down_revision = '1f6a3b8d2e95'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_index('ix_feed_active_expires', 'feed', ['expires'],
+                    postgresql_where=sa.text("status = 'active'"))
+    op.create_index('ix_feed_active_lretrieved', 'feed', ['last_retrieved'],
+                    postgresql_where=sa.text("status = 'active'"))
+
+
+def downgrade():
+    op.drop_index('ix_feed_active_lretrieved', table_name='feed')
+    op.drop_index('ix_feed_active_expires', table_name='feed')
@@ -0,0 +1,42 @@
+"""Storing parsed `Article.vector` as `vector_terms` and `vector_counts`
+
+Revision ID: 3c5b2d1e9a47
+Revises: f67f8fbefe1c
+Create Date: 2026-10-17 10:12:43.251904
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3c5b2d1e9a47'
+down_revision = 'f67f8fbefe1c'
+branch_labels = None
+depends_on = None
+
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+logger = logging.getLogger('alembic.' + revision)
+
+
+def upgrade():
+    op.add_column('article', sa.Column('vector_terms',
+                                       postgresql.ARRAY(sa.String()),
+                                       nullable=True))
+    op.add_column('article', sa.Column('vector_counts',
+                                       postgresql.ARRAY(sa.Integer()),
+                                       nullable=True))
+    logger.info('parsing existing article vectors')
+    op.execute("UPDATE article "
+               "SET (vector_terms, vector_counts) = ("
+               "SELECT coalesce(array_agg(lexeme ORDER BY lexeme), '{}'), "
+               "coalesce(array_agg(coalesce(array_length(positions, 1), 1) "
+               "ORDER BY lexeme), '{}') FROM unnest(vector)) "
+               "WHERE vector IS NOT NULL;")
+
+
+def downgrade():
+    op.drop_column('article', 'vector_counts')
+    op.drop_column('article', 'vector_terms')
@@ -1,6 +1,12 @@
+from unittest.mock import Mock, patch
+
 from tests.base import BaseJarrTest
 from jarr.controllers import (ArticleController, FeedController,
         UserController, ClusterController)
+from jarr.bootstrap import conf
+from jarr.lib.content_generator import (TruncatedContentGenerator,
+                                        get_content_generator)
+from jarr.lib.utils import utc_now
 
 USER_ID = 2
 
@@ -12,6 +18,102 @@ class ArticleControllerTest(BaseJarrTest):
         self._test_controller_rights(article,
                 UserController().get(id=article.user_id))
 
+    def test_challenge(self):
+        acontr = ArticleController(USER_ID)
+        known = [{'entry_id': art.entry_id, 'feed_id': art.feed_id,
+                  'user_id': art.user_id} for art in acontr.read()]
+        unknown = [{**known[0], 'entry_id': 'unknown entry'},
+                   {**known[0], 'feed_id': known[-1]['feed_id'] + 1000}]
+        self.assertEqual(unknown,
+                         list(acontr.challenge(known[:2] + unknown + known)))
+        self.assertEqual([], list(acontr.challenge(known)))
+        self.assertEqual([], list(acontr.challenge([])))
+
+    @patch('jarr.lib.content_generator.Goose')
+    def test_enhance_extraction_cache(self, goose):
+        goose.return_value.extract.return_value = Mock(
+                opengraph={'locale': 'en'}, meta_lang='fr',
+                final_url='http://final.url/',
+                meta_keywords='Monthy Python, Brian', tags={'Holy Graal'},
+                title='Flying Circus', cleaned_text='Bring out your dead !',
+                top_node_raw_html='<p>Bring out your dead !</p>')
+        FeedController().update({}, {'truncated_content': True})
+        acontr = ArticleController()
+        user_ids = {art.user_id for art in acontr.read()}
+        self.assertTrue(len(user_ids) > 1)
+        article_ids = [acontr.read(user_id=user_id).first().id
+                       for user_id in user_ids]
+        acontr.update({'id__in': article_ids}, {'link': 'http://a.link/'})
+        get_content_generator.cache_clear()
+
+        for article_id in article_ids:
+            ArticleController.enhance(acontr.get(id=article_id))
+        # page was extracted for the first user only
+        self.assertEqual(1, goose.return_value.extract.call_count)
+        for article_id in article_ids:
+            article = acontr.get(id=article_id)
+            self.assertEqual('Flying Circus', article.title)
+            self.assertEqual('en', article.lang)
+            self.assertEqual({'Holy Graal', 'Monthy Python', 'Brian'},
+                             set(article.tags))
+            self.assertEqual(1, article.simple_vector['dead'])
+
+    @patch('jarr.lib.content_generator.Goose')
+    def test_enhance_without_extraction_cache(self, goose):
+        goose.return_value.extract.return_value = Mock(
+                opengraph={'locale': 'en'}, meta_lang='fr',
+                final_url='http://final.url/', meta_keywords='', tags=set(),
+                title='Flying Circus', cleaned_text='Bring out your dead !',
+                top_node_raw_html='<p>Bring out your dead !</p>')
+        FeedController().update({}, {'truncated_content': True})
+        article = ArticleController(USER_ID).read().first()
+        conf.crawler.extraction_cache_ttl = 0
+        try:
+            ArticleController.enhance(article)
+            # the clusterizer doesn't fetch the page of enriched articles
+            article = ArticleController(USER_ID).get(id=article.id)
+            content = TruncatedContentGenerator(article).generate()
+        finally:
+            conf.crawler.extraction_cache_ttl = 86400
+        self.assertEqual('Flying Circus', content['title'])
+        self.assertEqual(1, goose.return_value.extract.call_count)
+
+    @patch('jarr.controllers.article.ArticleController.enhance',
+           wraps=ArticleController.enhance)
+    @patch('jarr.controllers.article.ENRICH_PAGE_LENGTH', 2)
+    def test_enrich_pending_articles(self, enhance):
+        acontr = ArticleController(USER_ID)
+        acontr.update({}, {'cluster_id': None, 'enriched': False,
+                           'retrieved_date': utc_now()})
+        article_ids = {article.id for article in acontr.read()}
+        ccontr = ClusterController(USER_ID)
+        self.assertEqual([], ccontr.clusterize_pending_articles())
+
+        self.assertEqual(article_ids, set(acontr.enrich_pending_articles()))
+        self.assertEqual(len(article_ids), enhance.call_count)
+        self.assertEqual(len(article_ids),
+                         len(ccontr.clusterize_pending_articles()))
+        # already enriched articles aren't enhanced again
+        self.assertEqual(len(article_ids), enhance.call_count)
+
+    def test_enrich_pending_articles_error(self):
+        acontr = ArticleController(USER_ID)
+        acontr.update({}, {'cluster_id': None, 'enriched': False,
+                           'retrieved_date': utc_now()})
+        failing, *article_ids = sorted(art.id for art in acontr.read())
+        original = ArticleController.enhance
+
+        def enhance(article, commit=True):
+            if article.id == failing:
+                raise ValueError()
+            return original(article, commit)
+
+        with patch('jarr.controllers.article.ArticleController.enhance',
+                   side_effect=enhance):
+            self.assertEqual(article_ids, acontr.enrich_pending_articles())
+        self.assertEqual([failing], [art.id for art
+                                     in acontr.read(enriched=False)])
+
     def _test_create_using_filters(self):
         # FIXME wait redo filters
         feed_ctr = FeedController(USER_ID)
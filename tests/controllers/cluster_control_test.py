@@ -1,10 +1,14 @@
 from datetime import timedelta
 from random import randint
+from types import SimpleNamespace
 
 from jarr.bootstrap import conf
 from jarr.controllers import (ArticleController, CategoryController,
                               ClusterController, FeedController,
                               UserController)
+from jarr.controllers.article_clusterizer import (get_minhash_pref,
+                                                  get_tfidf_pref)
+from jarr.lib.clustering_af.postgres_casting import to_vector
 from jarr.lib.enums import ClusterReason
 from tests.base import BaseJarrTest
 from tests.utils import update_on_all_objs
@@ -291,3 +295,90 @@ class ClusterControllerTest(BaseJarrTest):
         )
         article = self.create_article_from(cluster, feed)
         self.assertInCluster(article, cluster)
+
+    def test_cluster_minhash_control(self):
+        article = ArticleController().read(category_id__ne=None).first()
+        cluster = article.cluster
+        words = " ".join(f"wireword{i}" for i in range(100))
+        ArticleController().update(
+            {"id": cluster.main_article_id},
+            {"content": words, "vector": to_vector({"content": words})},
+        )
+        feed = FeedController(cluster.user_id).create(
+            title="new feed", cluster_conf={"min_sample_size": 1000}
+        )
+        update_on_all_objs(
+            articles=cluster.articles, feeds=[feed], cluster_enabled=True
+        )
+        article = self.create_article_from(
+            cluster, feed, link=f"{cluster.main_article.link} syndicated"
+        )
+        self.assertInCluster(article, cluster, ClusterReason.minhash)
+
+        FeedController().update(
+            {"id": feed.id},
+            {"cluster_conf": {"min_sample_size": 1000,
+                              "minhash_enabled": False}},
+        )
+        article = self.create_article_from(
+            cluster, feed, link=f"{cluster.main_article.link} syndicated again"
+        )
+        self.assertNotInCluster(article, cluster)
+        # not to be matched instead of the cluster below
+        ClusterController().delete(article.cluster_id)
+
+        # disabled on the user, enabling it on the feed wins
+        FeedController().update(
+            {"id": feed.id},
+            {"cluster_conf": {"min_sample_size": 1000,
+                              "minhash_enabled": True}},
+        )
+        UserController().update(
+            {"id": cluster.user_id},
+            {"cluster_conf": {"minhash_enabled": False}},
+        )
+        article = self.create_article_from(
+            cluster, feed, link=f"{cluster.main_article.link} syndicated 3"
+        )
+        self.assertInCluster(article, cluster, ClusterReason.minhash)
+
+        # disabling TF-IDF doesn't disable near-duplicates clustering
+        FeedController().update(
+            {"id": feed.id}, {"cluster_tfidf_enabled": False}
+        )
+        article = self.create_article_from(
+            cluster, feed, link=f"{cluster.main_article.link} syndicated 4"
+        )
+        self.assertInCluster(article, cluster, ClusterReason.minhash)
+
+    def test_cluster_pref_precedence(self):
+        def make_feed(user=None, category=None, feed=None):
+            return SimpleNamespace(
+                user=SimpleNamespace(cluster_conf=user),
+                category=SimpleNamespace(cluster_conf=category),
+                cluster_conf=feed)
+
+        default = conf.clustering.tfidf.min_score
+        self.assertEqual(default, get_tfidf_pref(make_feed(), "min_score"))
+        # first value set on the user, the category or the feed wins
+        self.assertEqual(.1, get_tfidf_pref(
+            make_feed({"min_score": .1}, {"min_score": .2},
+                      {"min_score": .3}), "min_score"))
+        self.assertEqual(.2, get_tfidf_pref(
+            make_feed(None, {"min_score": .2}, {"min_score": .3}),
+            "min_score"))
+        # falsy values on the user or category only count on the feed
+        self.assertEqual(.3, get_tfidf_pref(
+            make_feed({"min_score": 0}, {"min_score": None},
+                      {"min_score": .3}), "min_score"))
+        self.assertFalse(get_minhash_pref(
+            make_feed(None, {"minhash_enabled": False},
+                      {"minhash_enabled": False}), "enabled"))
+        self.assertTrue(get_minhash_pref(
+            make_feed({"minhash_enabled": True}, None,
+                      {"minhash_enabled": False}), "enabled"))
+        self.assertTrue(get_minhash_pref(
+            make_feed({"minhash_enabled": False}, {"minhash_enabled": False},
+                      {"minhash_enabled": True}), "enabled"))
+        self.assertEqual(conf.clustering.minhash.enabled, get_minhash_pref(
+            make_feed({"minhash_enabled": False}), "enabled"))
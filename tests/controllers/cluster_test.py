@@ -1,11 +1,20 @@
 from datetime import timedelta
 from random import randint
+from unittest.mock import patch
 
-from jarr.controllers import ArticleController, FeedController
-from jarr.controllers.article_clusterizer import Clusterizer
+from jarr.bootstrap import REDIS_CONN, conf
+from jarr.controllers import (ArticleController, CategoryController,
+                              FeedController, UserController)
+from jarr.controllers.article_clusterizer import (JARR_CORPUS_KEY,
+                                                  JARR_CORPUS_MAX_ID_KEY,
+                                                  Clusterizer)
 from jarr.controllers.cluster import ClusterController
+from jarr.lib.clustering_af.corpus import CorpusEntry
 from jarr.lib.clustering_af.grouper import get_best_match_and_score
 from jarr.lib.clustering_af.postgres_casting import to_vector
+from jarr.lib.enums import ClusterReason
+from jarr.lib.utils import utc_now
+from jarr.models import Article, Category
 from tests.base import BaseJarrTest
 from tests.utils import update_on_all_objs
 
@@ -111,6 +120,84 @@ class ClusterControllerTest(BaseJarrTest):
     def test_unread_on_cluster(self):
         self.assertFalse(self._test_unread_on_cluster("marked").read)
 
+    def test_config_resolution(self):
+        feed = FeedController().read(category_id__ne=None).first()
+        article = ArticleController().read(feed_id=feed.id).first()
+        UserController().update({"id": feed.user_id},
+                                {"cluster_same_feed": False})
+        CategoryController().update({"id": feed.category_id},
+                                    {"cluster_same_feed": True})
+        FeedController().update({"id": feed.id}, {"cluster_same_feed": None,
+                                                  "cluster_wake_up": False})
+        clusterizer = Clusterizer()
+        with patch.object(clusterizer, "_load_feed_configs",
+                          wraps=clusterizer._load_feed_configs) as load:
+            self.assertTrue(clusterizer.get_config(feed, "cluster_same_feed"))
+            self.assertTrue(
+                clusterizer.get_config(article, "cluster_same_feed")
+            )
+            self.assertFalse(
+                clusterizer.get_config(article, "cluster_wake_up")
+            )
+            for other in FeedController(feed.user_id).read():
+                clusterizer.get_config(other, "cluster_enabled")
+        self.assertEqual(1, load.call_count)
+
+        CategoryController().update({"id": feed.category_id},
+                                    {"cluster_same_feed": None})
+        clusterizer = Clusterizer()
+        self.assertFalse(clusterizer.get_config(article, "cluster_same_feed"))
+
+    def test_config_resolution_of_unloaded_feeds(self):
+        feed = FeedController().read().first()
+        clusterizer = Clusterizer()
+        clusterizer.get_config(feed, "cluster_enabled")
+        # a feed created after the configurations were loaded
+        new_feed = FeedController(feed.user_id).create(
+            title="new feed", cluster_enabled=False)
+        self.assertFalse(clusterizer.get_config(new_feed, "cluster_enabled"))
+        # a feed deleted since, falling back on its user's configuration
+        UserController().update({"id": feed.user_id},
+                                {"cluster_same_feed": False})
+        self.assertFalse(clusterizer._get_feed_config(
+            new_feed.id + 1000, feed.user_id, "cluster_same_feed"))
+
+    def test_cluster_config_resolution(self):
+        cluster = ClusterController().read().first()
+        clusterizer = Clusterizer()
+        with patch.object(ArticleController, "read",
+                          wraps=ArticleController(cluster.user_id).read) \
+                as read:
+            configs = {clusterizer.get_config(cluster, "cluster_enabled")
+                       for _ in range(3)}
+        self.assertEqual(1, len(configs))
+        self.assertEqual(1, read.call_count)
+        # a feed joining the cluster counts without querying again
+        feed = FeedController(cluster.user_id).create(
+            title="new feed", cluster_wake_up=False)
+        article = self._clone_article(
+            ArticleController(cluster.user_id), cluster.main_article, feed)
+        article.cluster_reason = ClusterReason.link
+        clusterizer.enrich_cluster(cluster, article)
+        self.assertFalse(clusterizer.get_config(cluster, "cluster_wake_up"))
+
+    def test_iter_pending_articles(self):
+        actrl = ArticleController(2)
+        articles = list(actrl.read())
+        for index, article in enumerate(articles):
+            # same dates on several articles, pages break on ids
+            actrl.update({"id": article.id},
+                         {"cluster_id": None,
+                          "date": articles[0].date - timedelta(index // 2)})
+        expected = [article.id for article in actrl.read(cluster_id=None)
+                    .order_by(Article.date, Article.id)]
+        with patch("jarr.controllers.cluster.PENDING_PAGE_LENGTH", 3):
+            self.assertEqual(
+                expected,
+                [article.id for article
+                 in ClusterController._iter_pending_articles(actrl)])
+        self.assertEqual(len(articles), len(expected))
+
     def test_adding_to_cluster_by_link(self):
         ccontr = ClusterController()
 
@@ -138,6 +225,63 @@ class ClusterControllerTest(BaseJarrTest):
         self.assertEqual(articles_count + 1, len(cluster.articles))
         self.assertFalse(cluster.read)
 
+    def test_adding_to_cluster_by_title(self):
+        ccontr = ClusterController()
+        cluster = ccontr.read().first()
+        article = cluster.articles[0]
+        fcontr = FeedController(cluster.user_id)
+        acontr = ArticleController(cluster.user_id)
+        acontr.update({"id": article.id},
+                      {"title": "Monty Python: the Holy Grail"})
+        feed = fcontr.read(id__ne=article.feed_id).first()
+        update_on_all_objs(articles=[article], feeds=[feed],
+                           cluster_enabled=True)
+        clone = acontr.create(
+            feed_id=feed.id, entry_id=article.entry_id + "amp",
+            link=article.link + "/amp", title="monty python  The HOLY grail",
+            content=article.content, date=article.date + timedelta(1),
+            retrieved_date=article.retrieved_date + timedelta(1))
+        short = acontr.create(
+            feed_id=feed.id, entry_id=article.entry_id + "short",
+            link=article.link + "/short", title="Holy Grail",
+            content=article.content, date=article.date + timedelta(1),
+            retrieved_date=article.retrieved_date + timedelta(1))
+        self.assertIsNone(short.title_hash)
+        with patch.object(Clusterizer, "_get_cluster_by_similarity",
+                          return_value=None) as similarity:
+            ccontr.clusterize_pending_articles()
+        clone, short = acontr.get(id=clone.id), acontr.get(id=short.id)
+        self.assertEqual(cluster.id, clone.cluster_id)
+        self.assertEqual("title", clone.cluster_reason.value)
+        self.assertNotEqual(cluster.id, short.cluster_id)
+        # only the short title went through tfidf
+        self.assertEqual(1, similarity.call_count)
+
+    def test_batch_clustering(self):
+        ccontr = ClusterController()
+        article = ccontr.read().first().articles[0]
+        fcontr = FeedController(article.user_id)
+        acontr = ArticleController(article.user_id)
+        feed = fcontr.read(id__ne=article.feed_id).first()
+        update_on_all_objs(feeds=[article.feed, feed], cluster_enabled=True)
+        # both articles are clustered in the same batch
+        clone = self._clone_article(acontr, article, article.feed)
+        acontr.delete(article.id)
+        other_clone = acontr.create(
+            feed_id=feed.id, entry_id=clone.entry_id + "other",
+            link=clone.link, title=clone.title, content=clone.content,
+            date=clone.date + timedelta(1),
+            retrieved_date=clone.retrieved_date)
+        with patch.object(Clusterizer, "commit",
+                          autospec=True, side_effect=Clusterizer.commit) \
+                as commit:
+            self.assertEqual(2, len(ccontr.clusterize_pending_articles()))
+        self.assertEqual(1, commit.call_count)
+        clone, other_clone = acontr.get(id=clone.id), \
+            acontr.get(id=other_clone.id)
+        self.assertEqual(clone.cluster_id, other_clone.cluster_id)
+        self.assertEqual(2, len(clone.cluster.articles))
+
     def test_similarity_clustering(self):
         words = "Monthi Python Shrubberi Holi Graal life Brian".split()
         words2 = "And now for something completely different".split()
@@ -147,7 +291,14 @@ class ClusterControllerTest(BaseJarrTest):
         actrl = ArticleController(2)
         actrl.update({}, {"vector": to_vector({"content": content})})
         for art in actrl.read():
+            self.assertEqual(sorted(simple_vector), art.vector_terms)
             self.assertEqual(art.simple_vector, simple_vector)
+            self.assertEqual(28, art.simple_vector_magnitude)
+        # articles whose vector hasn't been parsed in the database
+        actrl.update({}, {"vector_terms": None, "vector_counts": None})
+        for art in actrl.read():
+            self.assertEqual(art.simple_vector, simple_vector)
+            self.assertEqual(28, art.simple_vector_magnitude)
 
         art1, art2, art3 = actrl.read().limit(3)
         match, score = get_best_match_and_score(art1, [art2])
@@ -175,6 +326,187 @@ class ClusterControllerTest(BaseJarrTest):
         match, score = get_best_match_and_score(art1, [art2])
         self.assertEqual(0, score)
         self.assertEqual(match, art2)
+        match, score = get_best_match_and_score(art1, list(actrl.read()),
+                                                candidates={art3.id})
+        self.assertEqual(1, round(score, 10))
+        self.assertEqual(match, art3)
+        match, score = get_best_match_and_score(art1, [art3, art2],
+                                                candidates=set())
+        self.assertEqual(0, score)
+        self.assertEqual(match, art2)
+
+    def test_corpus_cache(self):
+        user_id = 2
+        corpus_key = JARR_CORPUS_KEY % user_id
+        max_id_key = JARR_CORPUS_MAX_ID_KEY % user_id
+        actrl = ArticleController(user_id)
+        content = "Monthi Python " * 10
+        actrl.update({}, {"vector": to_vector({"content": content})})
+        article, *others = actrl.read().order_by(Article.id)
+        update_on_all_objs(articles=others, cluster_enabled=True)
+        clusterizer = Clusterizer(user_id)
+        neighbors = list(clusterizer.get_neighbors(article))
+        self.assertEqual(len(others), len(neighbors))
+        self.assertEqual({art.id for art in (article, *others)},
+                         {int(id_) for id_ in REDIS_CONN.hkeys(corpus_key)})
+        self.assertEqual(others[-1].id, int(REDIS_CONN.get(max_id_key)))
+
+        # loading only articles clustered since the cache was built
+        REDIS_CONN.hdel(corpus_key, others[-1].id)
+        REDIS_CONN.set(max_id_key, others[-2].id, keepttl=True)
+        cached = CorpusEntry.loads(REDIS_CONN.hget(corpus_key, others[0].id))
+        self.assertEqual({"monthi": 10, "python": 10}, cached.simple_vector)
+        self.assertEqual(others[0].cluster_id, cached.cluster_id)
+        self.assertEqual(
+            clusterizer.corpus_lsh.signature(["monthi", "python"]),
+            cached.signature)
+        clusterizer = Clusterizer(user_id)
+        self.assertEqual({neighbor.id for neighbor in neighbors},
+                         {neighbor.id for neighbor
+                          in clusterizer.get_neighbors(article)})
+        self.assertEqual(len(others) + 1, REDIS_CONN.hlen(corpus_key))
+        self.assertEqual(others[-1].id, int(REDIS_CONN.get(max_id_key)))
+
+        # newly clustered articles are added to the cache
+        clone = self._clone_article(actrl, article, article.feed)
+        REDIS_CONN.expire(corpus_key, 100)
+        REDIS_CONN.expire(max_id_key, 100)
+        ClusterController(user_id).clusterize_pending_articles()
+        self.assertTrue(REDIS_CONN.hexists(corpus_key, clone.id))
+        # without sliding the rebuild deadline
+        self.assertTrue(0 < REDIS_CONN.ttl(corpus_key) <= 100)
+        self.assertTrue(0 < REDIS_CONN.ttl(max_id_key) <= 100)
+
+        # articles out of the clustering time window are pruned on load
+        old = CorpusEntry.loads(REDIS_CONN.hget(corpus_key, others[0].id))
+        old.date = old.retrieved_date = utc_now() - timedelta(days=30)
+        REDIS_CONN.hset(corpus_key, old.id, old.dumps())
+        list(Clusterizer(user_id).get_neighbors(article))
+        self.assertFalse(REDIS_CONN.hexists(corpus_key, old.id))
+
+        # articles leaving their cluster are forgotten
+        actrl.remove_from_cluster(actrl.get(id=others[1].id))
+        self.assertFalse(REDIS_CONN.hexists(corpus_key, others[1].id))
+
+        # moving a feed to another category drops the whole cache
+        category = CategoryController(user_id).read().filter(
+            Category.id != article.category_id).first()
+        FeedController(user_id).update({"id": article.feed_id},
+                                       {"category_id": category.id})
+        self.assertFalse(REDIS_CONN.exists(corpus_key, max_id_key))
+
+    def test_similarity_clustering_default_pruning(self):
+        actrl = ArticleController(2)
+        article, other = actrl.read().filter(Article.cluster_id.isnot(None),
+                                             Article.category_id.isnot(None)
+                                             ).limit(2)
+        update_on_all_objs(feeds=[article.feed], cluster_enabled=True,
+                           cluster_tfidf_enabled=True, cluster_same_feed=True)
+        common = {"common%d" % i: 2 for i in range(20)}
+        clusterizer = Clusterizer(2)
+        clusterizer.corpus_initialized = True
+        for entry_id in range(1000, 1030):
+            clusterizer._index(CorpusEntry(
+                entry_id, article.cluster_id, article.feed_id,
+                article.category_id, article.date, article.retrieved_date,
+                {**common, "rare%d" % entry_id: 2, "rarer%d" % entry_id: 2}))
+        # sharing with the article its rare terms and the common ones
+        clusterizer._index(CorpusEntry(
+            1030, other.cluster_id, article.feed_id, article.category_id,
+            article.date, article.retrieved_date,
+            {**common, "monthi": 10, "python": 10}))
+        article = actrl.get(id=article.id)
+
+        def cluster_with(content):
+            actrl.update({"id": article.id},
+                         {"vector": to_vector({"content": content})})
+            return clusterizer._get_cluster_by_similarity(
+                actrl.get(id=article.id))
+
+        # terms found in more than 10% of the corpus aren't counted
+        content = " ".join(" ".join(2 * [term]) for term in common)
+        self.assertIsNone(cluster_with(content))
+        # a single shared term isn't enough
+        self.assertIsNone(cluster_with(content + " monthi" * 10))
+        cluster = cluster_with(content + " monthi python" * 10)
+        self.assertEqual(other.cluster_id, cluster.id)
+        self.assertEqual(1030, article.cluster_tfidf_with)
+
+    def test_main_article_from_untruncated_feed(self):
+        actrl = ArticleController(2)
+        article = actrl.read(cluster_id__ne=None).first()
+        cluster = article.cluster
+        main_article_id = cluster.main_article_id
+        feed = FeedController(2).create(title="new feed")
+        clone = self._clone_article(actrl, article, feed)
+        FeedController().update({"id__in": [art.feed_id for art
+                                            in cluster.articles]},
+                                {"truncated_content": True})
+        clone.cluster_reason = ClusterReason.link
+        # an untruncated content doesn't replace an older main article
+        Clusterizer(2).enrich_cluster(cluster, clone)
+        self.assertEqual(main_article_id, cluster.main_article_id)
+        self.assertEqual(2, len(cluster.articles))
+
+    def test_age_out_corpus(self):
+        article = ArticleController(2).read().first()
+        clusterizer = Clusterizer(2)
+        clusterizer.corpus_initialized = True
+        day = timedelta(days=1)
+        old = article.date - timedelta(days=conf.clustering.time_delta)
+        old_retrieved = article.retrieved_date - timedelta(
+            days=conf.clustering.time_delta)
+        dates = {1000: (old, old_retrieved),  # outdated
+                 1001: (old - day, old_retrieved + day),
+                 1002: (old + day, old_retrieved - day),
+                 1003: (old + day, old_retrieved + day),
+                 1004: (old - day, old_retrieved - day)}  # outdated
+        for entry_id, (date, retrieved_date) in dates.items():
+            clusterizer._index(CorpusEntry(
+                entry_id, article.cluster_id, article.feed_id,
+                article.category_id, date, retrieved_date,
+                {"term%d" % i: 1 for i in range(entry_id - 997)}))
+        clusterizer._age_out_corpus(article)
+        self.assertEqual([1001, 1002, 1003],
+                         [entry.id for entry in clusterizer.corpus])
+        self.assertEqual([4, 5, 6], clusterizer._corpus_magnitudes)
+        self.assertEqual({1001, 1002, 1003}, clusterizer.corpus_index.doc_ids)
+        self.assertEqual(3, len(clusterizer.corpus_tfidf))
+        self.assertEqual(3, len(clusterizer.corpus_lsh))
+
+        # articles are aged out for once
+        article.date += 2 * day
+        article.retrieved_date += 2 * day
+        clusterizer._age_out_corpus(article)
+        self.assertEqual(3, len(clusterizer.corpus))
+        clusterizer._aged_out_for = None
+        clusterizer._age_out_corpus(article)
+        self.assertEqual([], clusterizer.corpus)
+        self.assertEqual({}, clusterizer._corpus_by_id)
+
+    def test_neighbors_magnitude_bounds(self):
+        article = ArticleController(2).read().first()
+        update_on_all_objs(feeds=[article.feed], cluster_enabled=True,
+                           cluster_tfidf_enabled=True, cluster_same_feed=True)
+        article = ArticleController(2).get(id=article.id)
+        clusterizer = Clusterizer(2)
+        clusterizer.corpus_initialized = True
+        magnitudes = [1, 40, 3, 8, 2, 12, 100, 6, 4]
+        for entry_id, magnitude in enumerate(magnitudes, 1000):
+            clusterizer._index(CorpusEntry(
+                entry_id, article.cluster_id, article.feed_id,
+                article.category_id, article.date, article.retrieved_date,
+                {"term%d" % i: 1 for i in range(magnitude)}))
+        self.assertEqual(sorted(clusterizer._corpus_magnitudes),
+                         clusterizer._corpus_magnitudes)
+        low = article.simple_vector_magnitude / 5
+        high = article.simple_vector_magnitude * 5
+        expected = {entry_id for entry_id, magnitude
+                    in enumerate(magnitudes, 1000)
+                    if max(2, low) <= magnitude <= high}
+        self.assertTrue(0 < len(expected) < len(magnitudes))
+        self.assertEqual(expected, {neighbor.id for neighbor
+                                    in clusterizer.get_neighbors(article)})
 
     def test_no_mixup(self):
         acontr = ArticleController()
@@ -147,6 +147,43 @@ class FeedControllerTest(BaseJarrTest):
                 "all feed will expire in a second, none are expired")
 
 
+    def test_expires_from_arrivals(self):
+        fctrl = FeedController()
+        feed = fctrl.read().first()
+        fctrl.update({'id': feed.id}, {'arrival_interval': None,
+                                       'last_arrival': None,
+                                       'arrival_profile': None})
+        now = utc_now()
+        dates = [now - timedelta(hours=hours) for hours in (24, 18, 12, 6)]
+        ArticleController().create_many(feed.id, [
+            {'entry_id': str(date), 'title': 'arrival', 'date': date}
+            for date in dates])
+        feed = fctrl.get(id=feed.id)
+        self.assertEqual(6 * 3600, feed.arrival_interval)
+        self.assertEqual(dates[-1], feed.last_arrival)
+        self.assertEqual(4, round(sum(feed.arrival_profile)))
+
+        fctrl.update({'id': feed.id}, {'expires': now})
+        # next article is expected in a few hours
+        self.assert_in_range(now + timedelta(seconds=conf.feed.min_expires),
+                             fctrl.get(id=feed.id).expires,
+                             now + timedelta(hours=6))
+
+    def test_update_unread_counts(self):
+        fctrl = FeedController(2)
+        feed_ids = [feed.id for feed in fctrl.read()]
+        ClusterController(2).update({"id__in": [
+            cluster.id for cluster in fctrl.get(id=feed_ids[0]).clusters]},
+            {"read": True})
+        expected = {feed_id: fctrl.update_unread_count(feed_id, True)
+                    for feed_id in feed_ids}
+        self.assertEqual(0, expected[feed_ids[0]])
+        self.assertTrue(any(expected.values()))
+        fctrl.update({"id__in": feed_ids}, {"unread_count": 42})
+        fctrl.update_unread_counts(feed_ids)
+        self.assertEqual(expected, {feed.id: feed.unread_count
+                                    for feed in fctrl.read()})
+
     def _test_fetching_anti_herding_mech(self, now):
         fctrl = FeedController()
         total = fctrl.read().count()
@@ -43,6 +43,32 @@ class CrawlerMainTest(BaseJarrTest):
         self.assertEqual(2, cluster.content['v'])
         self.assertEqual(0, len(cluster.content['contents']))
 
+    def test_articles_with_enclosure_created_at_once(self):
+        self._clean_objs()
+        feed = FeedController().read().first()
+        UserController().update({'id': feed.user_id},
+                                {'cluster_enabled': True})
+        builder = ClassicArticleBuilder(feed, self.entry_w_enclosure, {})
+        raw_articles = list(builder.enhance())
+        self.assertEqual(2, len(raw_articles))
+        ids = ArticleController(feed.user_id).create_many(feed.id,
+                                                          raw_articles)
+        self.assertEqual(2, len(ids))
+        a1 = ArticleController().get(id=ids[0])
+        a2 = ArticleController().get(id=ids[1])
+        self.assertIsNone(a1.article_type)
+        self.assertEqual('audio', a2.article_type.value)
+        self.assertEqual(0, a1.order_in_cluster)
+        self.assertEqual(1, a2.order_in_cluster)
+        self.assertEqual(a1.link_hash, a2.link_hash)
+        self.assertEqual(feed.category_id, a2.category_id)
+        self.assertIsNotNone(a1.vector)
+        self.assertIsNotNone(a1.date)
+        ClusterController(feed.user_id).clusterize_pending_articles()
+        a1 = ArticleController().get(id=ids[0])
+        a2 = ArticleController().get(id=ids[1])
+        self.assertEqual(a1.cluster_id, a2.cluster_id)
+
     @patch('jarr.lib.content_generator.TruncatedContentGenerator.get_vector')
     @patch('jarr.lib.content_generator.TruncatedContentGenerator.generate')
     def test_articles_with_enclosure_and_fetched_content(self, truncated_cnt,
@@ -69,6 +95,10 @@ class CrawlerMainTest(BaseJarrTest):
         for raw_article in raw_articles:
             articles.append(
                 ArticleController(feed.user_id).create(**raw_article))
+        # articles of truncated feeds are clustered once enriched
+        self.assertEqual(
+            [], ClusterController(feed.user_id).clusterize_pending_articles())
+        ArticleController(feed.user_id).enrich_pending_articles()
         ClusterController(feed.user_id).clusterize_pending_articles()
         a1 = ArticleController().get(id=articles[0].id)
         a2 = ArticleController().get(id=articles[1].id)
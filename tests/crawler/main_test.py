@@ -2,7 +2,9 @@ from datetime import datetime, timezone
 
 from unittest.mock import patch
 
-from jarr.controllers import FeedController, UserController
+from jarr.bootstrap import conf
+from jarr.controllers import (ArticleController, FeedController,
+                              UserController)
 from jarr.crawler.main import scheduler
 from jarr.lib.utils import utc_now
 from tests.base import BaseJarrTest
@@ -13,8 +15,10 @@ class CrawlerMainTest(BaseJarrTest):
     def setUp(self):
         super().setUp()
         self._clusteriser_patch = patch('jarr.crawler.main.clusterizer')
+        self._enricher_patch = patch('jarr.crawler.main.enricher')
         self._sched_async = patch('jarr.crawler.main.scheduler.apply_async')
         self._process_feed_patch = patch('jarr.crawler.main.process_feed')
+        self._process_feeds_patch = patch('jarr.crawler.main.process_feeds')
         self._feed_cleaner_patch = patch('jarr.crawler.main.feed_cleaner')
         self._metrics = [patch(f"jarr.crawler.main.{path}")
                          for path in ['metrics_users_any',
@@ -22,7 +26,9 @@ class CrawlerMainTest(BaseJarrTest):
                                       'metrics_users_long_term',
                                       'metrics_articles_unclustered']]
         self.clusteriser_patch = self._clusteriser_patch.start()
+        self.enricher_patch = self._enricher_patch.start()
         self.process_feed_patch = self._process_feed_patch.start()
+        self.process_feeds_patch = self._process_feeds_patch.start()
         self.feed_cleaner_patch = self._feed_cleaner_patch.start()
         self.scheduler_patch = self._sched_async.start()
         for metrics_patch in self._metrics:
@@ -30,7 +36,9 @@ class CrawlerMainTest(BaseJarrTest):
 
     def tearDown(self):
         self._clusteriser_patch.stop()
+        self._enricher_patch.stop()
         self._process_feed_patch.stop()
+        self._process_feeds_patch.stop()
         self._feed_cleaner_patch.stop()
         self._sched_async.stop()
         for metrics_patch in self._metrics:
@@ -57,3 +65,49 @@ class CrawlerMainTest(BaseJarrTest):
                          self.process_feed_patch.apply_async.call_count)
         self.assertEqual(0, self.clusteriser_patch.apply_async.call_count)
         self.assertEqual(2, self.feed_cleaner_patch.apply_async.call_count)
+
+    def test_scheduler_countdowns_capped(self):
+        UserController().update({}, {'last_connection': utc_now()})
+        fctrl = FeedController()
+        feed_count = fctrl.read().count()
+        for feed in fctrl.read():
+            fctrl.update({'id': feed.id},
+                         {'link': f'https://jarr.info/feed/{feed.id}'})
+        with patch.object(conf.feed, 'min_expires', 2), \
+                patch.object(conf.crawler, 'per_host_delay', 1):
+            scheduler()
+        # only tasks dispatched within min_expires // 2 seconds are sent
+        calls = self.process_feed_patch.apply_async.mock_calls
+        self.assertEqual([0, 0, 1, 1],
+                         [call[2]['countdown'] for call in calls])
+        # the others are left late for the next run
+        self.assertEqual(feed_count - 4, len(list(fctrl.list_late())))
+
+    def test_scheduler_enricher(self):
+        UserController().update({}, {'last_connection': utc_now()})
+        user_id = ArticleController().read().first().user_id
+        ArticleController().update({'user_id': user_id},
+                                   {'cluster_id': None, 'enriched': False,
+                                    'retrieved_date': utc_now()})
+        scheduler()
+        self.assertEqual([user_id], [call[2]['args'][0] for call in
+                                     self.enricher_patch.apply_async
+                                     .mock_calls])
+        # articles aren't ready for clustering yet
+        self.assertEqual(0, self.clusteriser_patch.apply_async.call_count)
+
+    def test_scheduler_chunked(self):
+        fctrl = FeedController()
+        feed_count = fctrl.read().count()
+        conf.crawler.chunk_size = 3
+        try:
+            scheduler()
+        finally:
+            conf.crawler.chunk_size = 1
+        self.assertEqual(0, self.process_feed_patch.apply_async.call_count)
+        calls = self.process_feeds_patch.apply_async.mock_calls
+        self.assertEqual(-(-feed_count // 3), len(calls))
+        feed_ids = [feed_id for call in calls
+                    for feed_id in call[2]['args'][0]]
+        self.assertEqual(feed_count, len(set(feed_ids)))
+        self.assertTrue(all(len(call[2]['args'][0]) <= 3 for call in calls))
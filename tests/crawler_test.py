@@ -1,18 +1,32 @@
+import asyncio
 import json
 import logging
 import unittest
-
+from datetime import timedelta
+from email.message import Message
+from itertools import count
 from unittest.mock import Mock, patch
 
-from jarr.bootstrap import conf
+import feedparser
+from requests import Request
+from requests.cookies import MockRequest, MockResponse
+
+from jarr.bootstrap import REDIS_CONN, conf
 from jarr.controllers import ArticleController, FeedController
+from jarr.crawler.crawlers.abstract import (JARR_FEED_ENTRIES_KEY,
+                                            AbstractCrawler)
 from jarr.crawler.crawlers.classic import ClassicCrawler
-from jarr.crawler.main import clusterizer, process_feed
-from jarr.crawler.requests_utils import (response_calculated_etag_match,
+from jarr.crawler.lib.feedparser_utils import stream_feed
+from jarr.crawler.main import clusterizer, process_feed, process_feeds
+from jarr.crawler.requests_utils import (dump_response, load_response,
+                                         response_calculated_etag_match,
                                          response_etag_match)
+from jarr.crawler.utils import (HostThrottle, acquire_locks,
+                                crawl_concurrently, get_dispatch_countdowns,
+                                get_session)
 from jarr.lib.enums import FeedType
 from jarr.lib.const import UNIX_START
-from jarr.lib.utils import digest
+from jarr.lib.utils import digest, normalize_url
 from jarr.models.feed import Feed
 from tests.base import JarrFlaskCommon
 
@@ -54,7 +68,9 @@ class CrawlerTest(JarrFlaskCommon):
             if url.startswith('feed') and len(url) == 6:
                 resp = Mock(status_code=self.resp_status_code,
                             headers=self.resp_headers, history=[],
-                            content=self._content, text=self._content)
+                            url=url, encoding='utf8',
+                            content=self._content.encode('utf8'),
+                            text=self._content)
                 resp.raise_for_status.return_value = self.resp_raise
                 resp.json = lambda: json.loads(self._content)
                 return resp
@@ -108,6 +124,115 @@ class CrawlerTest(JarrFlaskCommon):
         crawler()
         self.assertEqual(new_count, ArticleController().read().count())
 
+    def test_http_crawler_batch(self):
+        feeds = list(FeedController().list_fetchable())
+        feed_ids = [feed.id for feed in feeds]
+        locked = acquire_locks('process-feed', feed_ids[:1])
+        self.assertEqual(feed_ids[:1], locked)
+
+        with patch.object(FeedController, 'update_unread_counts',
+                          autospec=True,
+                          side_effect=FeedController.update_unread_counts) \
+                as update_unread_counts:
+            process_feeds.apply(args=[feed_ids])
+        # unread counts of the crawled feeds are updated at once
+        update_unread_counts.assert_called_once()
+        self.assertEqual(set(feed_ids[1:]),
+                         set(update_unread_counts.call_args[0][1]))
+        # feeds of a same link are fetched once
+        links = {feed.link for feed in feeds[1:]}
+        self.assertTrue(len(links) < len(feeds) - 1)
+        self.assertEqual(len(links), self.jarr_req.call_count)
+        self.assertTrue(BASE_COUNT < ArticleController().read().count())
+        # locks are released, except the one we hold
+        self.assertEqual(feed_ids[1:],
+                         acquire_locks('process-feed', feed_ids))
+
+    def test_shared_fetch(self):
+        feeds = list(FeedController().list_fetchable())
+        feed = feeds[0]
+        same_link = [other for other in feeds if other.link == feed.link]
+        self.assertTrue(len(same_link) > 1)
+        for other in same_link:
+            process_feed.apply(args=[other.id])
+        self.assertEqual(1, self.jarr_req.call_count)
+        for other in same_link:  # each feed got its own cache headers
+            other = FeedController().get(id=other.id)
+            self.assertEqual('jarr/"%s"' % digest(self._content), other.etag)
+            self.assertEqual(0, other.error_count)
+
+        shared_fetch_ttl = conf.crawler.shared_fetch_ttl
+        conf.crawler.shared_fetch_ttl = 0
+        try:
+            process_feed.apply(args=[feed.id])
+        finally:
+            conf.crawler.shared_fetch_ttl = shared_fetch_ttl
+        self.assertEqual(2, self.jarr_req.call_count)
+
+    def test_known_entries(self):
+        feed = FeedController().read().first()
+        process_feed.apply(args=[feed.id])
+        self.assertTrue(REDIS_CONN.spop(JARR_FEED_ENTRIES_KEY % feed.id))
+
+        self._reset_feeds_freshness()
+        # the forgotten entry may come after a run of known ones
+        known_entries_stop = conf.crawler.known_entries_stop
+        conf.crawler.known_entries_stop = 0
+        try:
+            with patch('jarr.crawler.crawlers.abstract.ArticleController'
+                       '.challenge') as challenge:
+                challenge.return_value = []
+                process_feed.apply(args=[feed.id])
+        finally:
+            conf.crawler.known_entries_stop = known_entries_stop
+        # only the forgotten entry is challenged again
+        self.assertEqual(1, challenge.call_count)
+        self.assertEqual(1, len(challenge.call_args[1]['ids']))
+        self.assertEqual(feed.id,
+                         challenge.call_args[1]['ids'][0]['feed_id'])
+
+    def test_stop_on_known_entries(self):
+        feed = FeedController().read().first()
+        process_feed.apply(args=[feed.id])
+        key = JARR_FEED_ENTRIES_KEY % feed.id
+        entry_count = REDIS_CONN.scard(key)
+        self.assertTrue(entry_count > 3)
+
+        self._reset_feeds_freshness()
+        known_entries_stop = conf.crawler.known_entries_stop
+        conf.crawler.known_entries_stop = 3
+        try:
+            with patch.object(AbstractCrawler, 'entry_digest', autospec=True,
+                              side_effect=AbstractCrawler.entry_digest) \
+                    as entry_digest:
+                process_feed.apply(args=[feed.id])
+        finally:
+            conf.crawler.known_entries_stop = known_entries_stop
+        self.assertEqual(3, entry_digest.call_count)
+        # digests of the entries that weren't reached are kept
+        self.assertEqual(entry_count, REDIS_CONN.scard(key))
+
+    def test_no_stop_on_oldest_first_entries(self):
+        feed = FeedController().read().first()
+        process_feed.apply(args=[feed.id])
+        entry_count = REDIS_CONN.scard(JARR_FEED_ENTRIES_KEY % feed.id)
+
+        self._reset_feeds_freshness()
+        # new entries may come after the known ones, they're all reached
+        dates = (UNIX_START + timedelta(days=days) for days in count())
+        known_entries_stop = conf.crawler.known_entries_stop
+        conf.crawler.known_entries_stop = 3
+        try:
+            with patch.object(AbstractCrawler, 'entry_digest', autospec=True,
+                              side_effect=AbstractCrawler.entry_digest) \
+                    as entry_digest, \
+                    patch.object(feed.crawler.article_builder, 'extract_date',
+                                 side_effect=lambda entry: next(dates)):
+                process_feed.apply(args=[feed.id])
+        finally:
+            conf.crawler.known_entries_stop = known_entries_stop
+        self.assertEqual(entry_count, entry_digest.call_count)
+
     def test_no_add_on_304(self):
         self.resp_status_code = 304
         self.assertEqual(BASE_COUNT, ArticleController().read().count())
@@ -188,6 +313,133 @@ class CrawlerMethodsTest(unittest.TestCase):
         self.assertTrue(response_etag_match(self.feed, self.resp))
         self.assertFalse(response_calculated_etag_match(self.feed, self.resp))
 
+    def test_dump_load_response(self):
+        resp = Mock(status_code=200, url='new_link', encoding='utf8',
+                    headers={'ETag': 'etag'}, content=b'content',
+                    history=[Mock(status_code=301, url='link')])
+        dumped = dump_response(resp)
+        self.assertEqual('new_link', json.loads(dumped)['url'])
+        loaded = load_response(dumped)
+        self.assertEqual(200, loaded.status_code)
+        self.assertEqual('new_link', loaded.url)
+        self.assertEqual('etag', loaded.headers['etag'])
+        self.assertEqual('content', loaded.text)
+        self.assertEqual([(301, 'link')], [(prev.status_code, prev.url)
+                                           for prev in loaded.history])
+        resp.content = b'\x89PNG\x00\xff'
+        self.assertEqual(resp.content,
+                         load_response(dump_response(resp)).content)
+
+    def test_stream_feed(self):
+        with open('tests/fixtures/example.feed.atom', 'rb') as fd:
+            content = fd.read().strip()
+        parsed, entries = stream_feed(content)
+        self.assertEqual('1pxsolidblack', parsed['feed']['title'])
+        self.assertEqual([], parsed['entries'])
+        self.assertEqual(feedparser.parse(content)['entries'], list(entries))
+
+        content = (b'<rss version="2.0"><channel><title>feed</title>'
+                   b'<item><title>first</title></item>'
+                   b'<item><title>broken&nbsp;</title></item>'
+                   b'</channel></rss>')
+        parsed, entries = stream_feed(content)
+        self.assertEqual('feed', parsed['feed']['title'])
+        # falling back on feedparser once the content turned out malformed
+        self.assertEqual(['first', 'broken'],
+                         [entry['title'].strip() for entry in entries])
+        parsed, entries = stream_feed(b'not a feed')
+        self.assertTrue(parsed['bozo'])
+        self.assertEqual([], list(entries))
+
+    def test_normalize_url(self):
+        self.assertEqual('https://jarr.info/feed?a=b',
+                         normalize_url('HTTPS://Jarr.Info:443/feed?a=b#top'))
+        self.assertEqual('http://jarr.info:8080/',
+                         normalize_url('http://jarr.info:8080'))
+        self.assertEqual(normalize_url('http://jarr.info/feed'),
+                         normalize_url('http://JARR.info:80/feed'))
+
+    def test_get_session(self):
+        session = get_session('https://jarr.info/feed')
+        self.assertIs(session, get_session('https://JARR.info:443/other'))
+        self.assertIsNot(session, get_session('https://jarr.info/feed',
+                                              ssrf_protect=False))
+        self.assertIsNot(session, get_session('https://1pxsolidblack.pl/'))
+
+        # no cookie shared between users
+        headers = Message()
+        headers['Set-Cookie'] = 'session=secret; Path=/'
+        session.cookies.extract_cookies(
+            MockResponse(headers),
+            MockRequest(Request('GET', 'https://jarr.info/feed').prepare()))
+        self.assertFalse(session.cookies)
+
+        # least recently used sessions are closed
+        with patch('jarr.crawler.utils.MAX_SESSIONS', 2), \
+                patch.object(session, 'close') as close:
+            get_session('https://1pxsolidblack.pl/')
+            get_session('https://example.com/')
+            close.assert_called_once_with()
+        self.assertIsNot(session, get_session('https://jarr.info/feed'))
+
+    def test_host_throttle(self):
+        throttle = HostThrottle(concurrency=2, delay=10)
+        loop = asyncio.new_event_loop()
+        starts = []
+
+        async def _request(url):
+            async with throttle.slot(url):
+                starts.append((url, loop.time()))
+
+        async def _crawl():
+            await asyncio.gather(_request('http://a/1'),
+                                 _request('http://a/2'),
+                                 _request('http://b/1'))
+            # third request on the same host would wait for delay
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(_request('http://a/3'), timeout=.1)
+        try:
+            loop.run_until_complete(_crawl())
+        finally:
+            loop.close()
+        self.assertEqual(['http://a/1', 'http://a/2', 'http://b/1'],
+                         sorted(url for url, _ in starts))
+
+    def test_host_throttle_shared(self):
+        loop = asyncio.new_event_loop()
+
+        async def _request(throttle, url):
+            async with throttle.slot(url):
+                pass
+
+        async def _crawl():
+            # as another worker would, a second throttle shares the rate
+            workers = HostThrottle(concurrency=2, delay=100), \
+                HostThrottle(concurrency=2, delay=100)
+            await asyncio.gather(_request(workers[0], 'http://a/1'),
+                                 _request(workers[1], 'http://a/2'),
+                                 _request(workers[1], 'http://b/1'))
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(_request(workers[1], 'http://a/3'),
+                                       timeout=.1)
+        try:
+            loop.run_until_complete(_crawl())
+        finally:
+            loop.close()
+
+    def test_get_dispatch_countdowns(self):
+        urls = ['http://a/1', 'http://a/2', 'http://b/1', 'http://a/3',
+                'http://A:80/2', 'http://a/4', 'http://a/5']
+        self.assertEqual([0, 0, 0, 5, 5, 5, 10],
+                         get_dispatch_countdowns(urls, concurrency=2, delay=5))
+        # tasks delayed past max_countdown are left for later
+        self.assertEqual([0, 0, 0, 5, 5, 5, None],
+                         get_dispatch_countdowns(urls, concurrency=2, delay=5,
+                                                 max_countdown=5))
+        self.assertEqual([0, 0, 0, None, None, None, None],
+                         get_dispatch_countdowns(urls, concurrency=2, delay=5,
+                                                 max_countdown=0))
+
     @patch('jarr.crawler.main.FeedController.update')
     def test_set_feed_error_w_error(self, fctrl_update):
         original_error_count = self.feed.error_count
@@ -238,3 +490,27 @@ class CrawlerMethodsTest(unittest.TestCase):
         self.assertTrue('description' not in data)
         self.assertTrue('site_link' not in data)
         self.assertTrue('icon_url' not in data)
+
+    @patch('jarr.crawler.crawlers.abstract.jarr_get')
+    @patch('jarr.crawler.main.FeedController.update')
+    def test_crawl_concurrently(self, fctrl_update, jarr_get):
+        other_feed = Feed(user_id=1, id=2, title='other', etag='',
+                          error_count=0, feed_type=FeedType.classic,
+                          link='other link')
+
+        def _get(url, **kwargs):
+            if url == 'link':
+                raise Exception('an error')
+            return self.resp
+        jarr_get.side_effect = _get
+
+        crawl_concurrently([ClassicCrawler(self.feed),
+                            ClassicCrawler(other_feed)], concurrency=1)
+
+        self.assertEqual(2, jarr_get.call_count)
+        self.assertEqual(2, fctrl_update.call_count)
+        updates = {call[1][0]['id']: call[1][1]
+                   for call in fctrl_update.mock_calls}
+        self.assertEqual(self.feed.error_count + 1, updates[1]['error_count'])
+        self.assertEqual('an error', updates[1]['last_error'])
+        self.assertEqual(0, updates[2]['error_count'])
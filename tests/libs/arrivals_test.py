@@ -0,0 +1,66 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from jarr.lib.arrivals import (HOURS_IN_WEEK, hour_of_week,
+                               predict_next_arrival, update_arrivals)
+
+MONDAY = datetime(2026, 10, 12, tzinfo=timezone.utc)
+WEEK = timedelta(days=7)
+
+
+class ArrivalsTest(unittest.TestCase):
+
+    @staticmethod
+    def model(dates):
+        return update_arrivals(None, None, None, dates)
+
+    def test_update(self):
+        interval, last, profile = self.model([MONDAY + timedelta(hours=2),
+                                              MONDAY])
+        self.assertEqual(7200, interval)
+        self.assertEqual(MONDAY + timedelta(hours=2), last)
+        self.assertEqual(HOURS_IN_WEEK, len(profile))
+        self.assertAlmostEqual(1.9979, sum(profile), places=4)
+        self.assertEqual(1, profile[2])
+
+        # older or known dates are ignored
+        self.assertEqual((interval, last, profile),
+                         update_arrivals(interval, last, profile,
+                                         [MONDAY, last]))
+        interval, last, _ = update_arrivals(interval, last, profile,
+                                            [last + timedelta(hours=12)])
+        self.assertEqual(.3 * 12 * 3600 + .7 * 7200, interval)
+
+    def test_no_prediction(self):
+        now = MONDAY + WEEK
+        self.assertIsNone(predict_next_arrival(None, None, None, now, WEEK))
+        interval, last, profile = self.model([MONDAY])
+        self.assertIsNone(predict_next_arrival(interval, last, profile,
+                                               now, WEEK))
+
+    def test_regular_feed(self):
+        dates = [MONDAY + timedelta(hours=hours) for hours in range(0, 48, 4)]
+        interval, last, profile = self.model(dates)
+        now = last + timedelta(minutes=30)
+        predicted = predict_next_arrival(interval, last, profile, now, WEEK)
+        self.assertTrue(now < predicted < last + timedelta(hours=8))
+
+    def test_seasonal_feed(self):
+        # a feed publishing every day at 9
+        dates = [MONDAY + timedelta(days=days, hours=9)
+                 for days in range(14)]
+        interval, last, profile = self.model(dates)
+        now = last + timedelta(hours=2)
+        predicted = predict_next_arrival(interval, last, profile, now, WEEK)
+        self.assertEqual(now.date() + timedelta(days=1), predicted.date())
+        self.assertEqual(9, predicted.hour)
+        self.assertEqual(hour_of_week(dates[0]), hour_of_week(predicted))
+
+    def test_overdue_feed(self):
+        dates = [MONDAY + timedelta(hours=hours) for hours in range(0, 10)]
+        interval, last, profile = self.model(dates)
+        now = last + timedelta(days=2)
+        predicted = predict_next_arrival(interval, last, profile, now, WEEK)
+        self.assertTrue(now + timedelta(days=1) < predicted)
+        self.assertIsNone(predict_next_arrival(interval, last, profile,
+                                               now, timedelta(hours=12)))
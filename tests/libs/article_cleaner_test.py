@@ -5,6 +5,7 @@ from unittest.mock import patch
 from requests import Response
 from requests.exceptions import MissingSchema
 
+from jarr.bootstrap import REDIS_CONN
 from jarr.models.feed import Feed
 from jarr.lib.enums import ArticleType
 from jarr.crawler.article_builders.classic import ClassicArticleBuilder
@@ -18,9 +19,11 @@ class ConstructArticleTest(unittest.TestCase):
         module = 'jarr.crawler.article_builders.abstract.'
         self._head_patch = patch(module + 'requests.head')
         self.head_patch = self._head_patch.start()
+        REDIS_CONN.flushdb()
 
     def tearDown(self):
         self._head_patch.stop()
+        REDIS_CONN.flushdb()
 
     @property
     def entry(self):
@@ -111,3 +114,38 @@ class ConstructArticleTest(unittest.TestCase):
         self.assertEqual(1, article['user_id'])
         self.assertEqual(ArticleType.embedded, article['article_type'])
         self.assertEqual(1, article['feed_id'])
+
+    def test_resolution_cache(self):
+        self.head_patch.return_value = self.get_response('http:')
+        for feed_id in 1, 2:
+            article, = ClassicArticleBuilder(Feed(id=feed_id, user_id=1),
+                                             self.entry, {}).enhance()
+            self.assertEqual('http:' + self.response_url, article['link'])
+        # second article reused the resolution of the first one
+        self.assertEqual(1, self.head_patch.call_count)
+
+        self.head_patch.return_value = None
+        entry = self.entry
+        entry['link'] = 'http://failing.link/'
+        for feed_id in 1, 2:
+            article, = ClassicArticleBuilder(Feed(id=feed_id, user_id=1),
+                                             entry, {}).enhance()
+            self.assertEqual('http://failing.link/', article['link'])
+        # failure is remembered as well
+        self.assertEqual(2, self.head_patch.call_count)
+
+    def test_resolve_links(self):
+        self.head_patch.return_value = self.get_response('http:')
+        builders = []
+        for link in 'http://link.one/', 'http://link.two/':
+            entry = self.entry
+            entry['link'] = link
+            builders.append(ClassicArticleBuilder(Feed(id=1, user_id=1),
+                                                  entry, {}))
+        ClassicArticleBuilder.resolve_links(builders)
+        self.assertEqual(2, self.head_patch.call_count)
+
+        for builder in builders:
+            article, = builder.enhance()
+            self.assertEqual('http:' + self.response_url, article['link'])
+        self.assertEqual(2, self.head_patch.call_count)
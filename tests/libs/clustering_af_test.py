@@ -0,0 +1,231 @@
+import unittest
+from math import log10
+from random import Random
+from time import perf_counter
+from unittest.mock import patch
+
+from jarr.lib.clustering_af.inverted_index import InvertedIndex
+from jarr.lib.clustering_af.minhash import MinHashLSH
+from jarr.lib.clustering_af.vector import (TFIDFCorpus, TFIDFMatrix,
+                                           TFIDFVector)
+
+
+class InvertedIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = InvertedIndex()
+        self.index.add(1, {'monty': 1, 'python': 2, 'grail': 1})
+        self.index.add(2, {'monty': 1, 'python': 1, 'brian': 3})
+        self.index.add(3, {'python': 1, 'flying': 1, 'circus': 1})
+        self.index.add(4, None)
+
+    def test_size(self):
+        self.assertEqual(4, len(self.index))
+        self.index.add(1, {'monty': 1})
+        self.assertEqual(4, len(self.index))
+
+    def test_document_frequency(self):
+        self.assertEqual(3, self.index.document_frequency('python'))
+        self.assertEqual(0, self.index.document_frequency('holy'))
+        self.index.remove(2, {'monty': 1, 'python': 1, 'brian': 3})
+        self.index.remove(2, {'monty': 1, 'python': 1, 'brian': 3})
+        self.assertEqual(3, len(self.index))
+        self.assertEqual(2, self.index.document_frequency('python'))
+        self.assertEqual(0, self.index.document_frequency('brian'))
+        self.assertNotIn('brian', self.index.postings)
+        self.assertEqual({1}, self.index.get_candidates(['monty']))
+
+    def test_candidates(self):
+        self.assertEqual({1, 2, 3}, self.index.get_candidates(['python']))
+        self.assertEqual({1, 2}, self.index.get_candidates(['monty', 'x']))
+        self.assertEqual(set(), self.index.get_candidates(['holy']))
+        self.assertEqual(set(), self.index.get_candidates(None))
+
+    def test_candidates_min_shared_terms(self):
+        terms = ['monty', 'python', 'grail']
+        self.assertEqual({1, 2}, self.index.get_candidates(terms, 2))
+        self.assertEqual({1}, self.index.get_candidates(terms, 3))
+
+    @patch('jarr.lib.clustering_af.inverted_index.'
+           'MIN_COMMON_TERM_POSTINGS', 0)
+    def test_candidates_common_terms(self):
+        # python is held by 3 documents out of 4, monty by 2 out of 4
+        terms = ['monty', 'python', 'grail']
+        self.assertEqual({1, 2},
+                         self.index.get_candidates(terms, 1, .5))
+        self.assertEqual({1}, self.index.get_candidates(terms, 2, .5))
+        self.assertEqual(set(), self.index.get_candidates(terms, 1, .2))
+
+    def test_candidates_common_terms_in_small_corpus(self):
+        terms = ['monty', 'python', 'grail']
+        self.assertEqual({1, 2, 3},
+                         self.index.get_candidates(terms, 1, .2))
+
+
+class TFIDFMatrixTest(unittest.TestCase):
+    documents = [{'monty': 1, 'python': 2, 'grail': 1},
+                 {'monty': 1, 'python': 1, 'brian': 3},
+                 {'python': 1, 'flying': 1, 'circus': 1},
+                 {'holy': 2, 'grail': 2},
+                 {},
+                 {'monty': 1, 'python': 2, 'grail': 1}]
+
+    def setUp(self):
+        self.matrix = TFIDFMatrix((doc, sum(doc.values()))
+                                  for doc in self.documents)
+
+    def test_encoding(self):
+        self.assertEqual(len(self.documents), len(self.matrix))
+        self.assertEqual(7, len(self.matrix.vocabulary))
+        self.assertEqual(len(self.matrix.vocabulary), len(self.matrix.idf))
+        self.assertEqual(sum(map(len, self.documents)),
+                         len(self.matrix.indices))
+
+    def test_same_scores_as_tfidf_vectors(self):
+        frequencies = {}
+        for doc in self.documents:
+            for term in doc:
+                frequencies[term] = frequencies.get(term, 0) + 1
+        corpus_size = len(self.documents)
+
+        def to_vector(doc, left=False):
+            return TFIDFVector(doc, sum(doc.values()), frequencies,
+                               corpus_size, will_be_left_member=left)
+
+        for row, doc in enumerate(self.documents):
+            left = to_vector(doc, True)
+            for other, score in self.matrix.get_cosine_similarities(row):
+                right = to_vector(self.documents[other])
+                norms = left.norm * right.norm
+                expected = (left * right) / norms if norms else 0
+                self.assertAlmostEqual(expected, score)
+
+    def test_scoring_subset(self):
+        scores = dict(self.matrix.get_cosine_similarities(0, [1, 3, 4, 5]))
+        self.assertEqual([1, 3, 4, 5], list(scores))
+        self.assertEqual(0, scores[4])
+        self.assertAlmostEqual(1, scores[5])
+        self.assertTrue(0 < scores[3] < scores[5])
+
+    def test_external_document_frequencies(self):
+        frequencies = {'monty': 10, 'python': 50, 'grail': 1}
+        matrix = TFIDFMatrix(((doc, sum(doc.values()))
+                              for doc in self.documents[:2]),
+                             lambda term: frequencies.get(term, 0), 100)
+        self.assertEqual(2, len(matrix))
+        for term, term_id in matrix.vocabulary.items():
+            self.assertAlmostEqual(
+                log10(100 / (1 + frequencies.get(term, 0))),
+                matrix.idf[term_id])
+
+    def test_faster_than_tfidf_vectors(self):
+        rand = Random(0)
+        vocabulary = [f'term{i}' for i in range(5000)]
+        documents = [{term: rand.randint(1, 5)
+                      for term in rand.sample(vocabulary, 100)}
+                     for _ in range(101)]
+        documents = [(doc, sum(doc.values())) for doc in documents]
+
+        start = perf_counter()
+        frequencies = {}
+        for doc, _ in documents:
+            for term in doc:
+                frequencies[term] = frequencies.get(term, 0) + 1
+        left = TFIDFVector(*documents[0], frequencies, len(documents),
+                           will_be_left_member=True)
+        # formerly one vector per pair
+        products = [left * TFIDFVector(doc, size, frequencies, len(documents))
+                    for doc, size in documents[1:]]
+        per_pair = perf_counter() - start
+
+        start = perf_counter()
+        scores = list(TFIDFMatrix(documents).get_cosine_similarities(
+            0, range(1, len(documents))))
+        self.assertLess(perf_counter() - start, per_pair / 2)
+        self.assertEqual(len(products), len(scores))
+
+
+class TFIDFCorpusTest(unittest.TestCase):
+    documents = TFIDFMatrixTest.documents
+
+    def setUp(self):
+        self.corpus = TFIDFCorpus()
+        for doc_id, doc in enumerate(self.documents[1:], 1):
+            self.corpus.add(doc_id, doc, sum(doc.values()))
+
+    def test_same_scores_as_matrix(self):
+        matrix = TFIDFMatrix((doc, sum(doc.values()))
+                             for doc in self.documents)
+        expected = dict(matrix.get_cosine_similarities(0, [1, 3, 5]))
+        doc = self.documents[0]
+        scores = dict(self.corpus.get_cosine_similarities(
+            doc, sum(doc.values()), [1, 3, 5]))
+        self.assertEqual(list(expected), list(scores))
+        for doc_id, score in expected.items():
+            self.assertAlmostEqual(score, scores[doc_id])
+        # scoring a document of the corpus
+        self.corpus.add(0, doc, sum(doc.values()))
+        scores = dict(self.corpus.get_cosine_similarities(
+            doc, sum(doc.values()), [1, 3, 5], 0))
+        for doc_id, score in expected.items():
+            self.assertAlmostEqual(score, scores[doc_id])
+
+    def test_remove(self):
+        self.assertEqual(3, self.corpus.document_frequency('python'))
+        self.corpus.remove(2)
+        self.corpus.remove(2)
+        self.assertEqual(4, len(self.corpus))
+        self.assertEqual(2, self.corpus.document_frequency('python'))
+        self.assertNotIn('circus', self.corpus.vocabulary)
+        self.corpus.add(6, {'spam': 3}, 3)
+        self.assertEqual(1, self.corpus.document_frequency('spam'))
+        self.assertEqual(len(self.corpus.vocabulary),
+                         len(set(self.corpus.vocabulary.values())))
+        for doc_id in (1, 3, 4, 5, 6):
+            self.corpus.remove(doc_id)
+        self.assertFalse(self.corpus.vocabulary)
+
+
+class MinHashLSHTest(unittest.TestCase):
+
+    def setUp(self):
+        self.words = ['word%d' % i for i in range(100)]
+        self.lsh = MinHashLSH(64, 16)
+        self.lsh.add(1, self.words)
+        self.lsh.add(2, self.words[:95] + ['other%d' % i for i in range(5)])
+        self.lsh.add(3, ['other%d' % i for i in range(100)])
+        self.lsh.add(4, None)
+
+    def test_signature(self):
+        self.assertIsNone(self.lsh.signature([]))
+        self.assertEqual(64, len(self.lsh.signature(self.words)))
+        self.assertEqual(self.lsh.signature(self.words),
+                         MinHashLSH(64, 16).signature(reversed(self.words)))
+        self.assertRaises(ValueError, MinHashLSH, 64, 10)
+
+    def test_add_signature(self):
+        lsh = MinHashLSH(64, 16)
+        lsh.add(1, None, self.lsh.signature(self.words))
+        self.assertEqual(self.lsh.signatures[1], lsh.signatures[1])
+        self.assertEqual([1], [doc_id for doc_id, _
+                               in lsh.query(self.words, 1.)])
+
+    def test_query(self):
+        self.assertEqual(3, len(self.lsh))
+        results = list(self.lsh.query(self.words))
+        self.assertEqual((1, 1.), results[0])
+        self.assertEqual(2, results[1][0])
+        self.assertTrue(.75 < results[1][1] < 1)
+        self.assertNotIn(3, [doc_id for doc_id, _ in results])
+        self.assertEqual([1], [doc_id for doc_id, _
+                               in self.lsh.query(self.words, 1.)])
+
+    def test_remove(self):
+        self.lsh.remove(1)
+        self.lsh.remove(1)
+        self.assertEqual(2, len(self.lsh))
+        self.assertEqual([2], [doc_id for doc_id, _
+                               in self.lsh.query(self.words, .5)])
+        self.lsh.remove(2)
+        self.lsh.remove(3)
+        self.assertFalse(self.lsh.buckets)
@@ -0,0 +1,46 @@
+from unittest.mock import patch
+
+from jarr.controllers.article import ArticleController
+from jarr.lib import content_generator
+from jarr.lib.link_resolution import (get_resolution, make_resolution,
+                                     set_resolution)
+from tests.base import JarrFlaskCommon
+
+
+class ExtractionFailureTest(JarrFlaskCommon):
+
+    def setUp(self):
+        super().setUp()
+        self.article = ArticleController().read().first()
+
+    def get_goose(self):
+        generator = content_generator.TruncatedContentGenerator(self.article)
+        return generator._get_goose()
+
+    @patch('jarr.lib.content_generator.Goose')
+    def test_extraction_failure(self, goose):
+        goose.return_value.extract.side_effect = ValueError
+        set_resolution(self.article.link,
+                       make_resolution(self.article.link, 'text/html'))
+        for _ in range(2):
+            self.assertFalse(self.get_goose())
+        self.assertEqual(1, goose.return_value.extract.call_count)
+        # the resolution of the link is kept
+        self.assertEqual('text/html',
+                         get_resolution(self.article.link)['content_type'])
+
+    @patch('jarr.lib.content_generator.Goose')
+    def test_failing_head_still_extracted(self, goose):
+        goose.return_value.extract.side_effect = ValueError
+        set_resolution(self.article.link, {})  # HEAD rejected by the site
+        self.assertFalse(self.get_goose())
+        self.assertEqual(1, goose.return_value.extract.call_count)
+
+    @patch('jarr.lib.content_generator.Goose')
+    def test_extraction_failure_disabled(self, goose):
+        goose.return_value.extract.side_effect = ValueError
+        with patch.object(content_generator.conf.crawler,
+                          'extraction_failure_ttl', 0):
+            for _ in range(2):
+                self.assertFalse(self.get_goose())
+        self.assertEqual(2, goose.return_value.extract.call_count)